@@ -0,0 +1,93 @@
+import time
+import bleak
+import asyncio
+from zippy_mock import MockZippyClient
+from msband.protocol import BLEv2Interface
+from msband.static.command import SRAMFWUpdateLoadData, GetPcbId, Pass
+
+
+PAYLOAD_SIZES = {"4 KB": 4 << 10, "32 KB": 32 << 10}
+COMMAND_COUNT = 50
+BATCH_SIZE = 15  # a dashboard refresh worth of read-only commands
+INTERVAL = 0.001  # connection interval the mock simulates, in seconds
+
+
+def responder(command, arguments, transfer):
+    if command is GetPcbId:
+        return (26).to_bytes(8, "little")
+    return b""
+
+
+async def connect(**kwargs) -> BLEv2Interface:
+    client = MockZippyClient(responder, interval=INTERVAL, **kwargs)
+    bleak.BleakClient = lambda id: client
+    band = BLEv2Interface()
+    await band.acquire("mock")
+    return band
+
+
+async def handshake_load(band: BLEv2Interface, payload: bytes):
+    # One acknowledged write and one control round trip per fragment, like command sends
+    packet, _, transfer = SRAMFWUpdateLoadData.build_command_packet(
+        UpdateFileStream=payload, Response=Pass
+    )
+    async with band.session():
+        await band.send(packet, raw=False)
+        for offset in range(0, len(transfer), band.window):
+            await band.send(transfer[offset : offset + band.window], raw=False)
+        await band.receive(6)
+
+
+async def pipelined_load(band: BLEv2Interface, payload: bytes):
+    await band.command(SRAMFWUpdateLoadData, UpdateFileStream=payload, Response=Pass)
+
+
+async def benchmark(label: str, load, payload: bytes):
+    band = await connect(max_aligned=20, credits=16)
+    started = time.perf_counter()
+    await load(band, payload)
+    elapsed = time.perf_counter() - started
+    print(f"{label:>12}: {elapsed * 1e3:10.1f} ms  {len(payload) / elapsed / 1024:8.1f} KiB/s")
+
+
+async def benchmark_commands(label: str, streaming: bool):
+    band = await connect(max_aligned=20, credits=16)
+    band.streaming = streaming
+    started = time.perf_counter()
+    async with band.session():
+        for _ in range(COMMAND_COUNT):
+            await band.command(GetPcbId)
+    elapsed = time.perf_counter() - started
+    print(f"{label:>12}: {elapsed / COMMAND_COUNT * 1e3:10.2f} ms per GetPcbId")
+
+
+async def benchmark_batch(label: str, batched: bool):
+    band = await connect(max_aligned=20, credits=16)
+    started = time.perf_counter()
+    if batched:
+        await band.batch([(GetPcbId, {})] * BATCH_SIZE)
+    else:
+        for _ in range(BATCH_SIZE):
+            await band.command(GetPcbId)
+    elapsed = time.perf_counter() - started
+    print(f"{label:>12}: {elapsed * 1e3:10.1f} ms for {BATCH_SIZE} commands")
+
+
+async def main():
+    for size_name, size in PAYLOAD_SIZES.items():
+        payload = bytes(range(256)) * (size // 256)
+        print(f"{size_name} payload")
+        await benchmark("handshake", handshake_load, payload)
+        await benchmark("pipelined", pipelined_load, payload)
+
+    print(f"{COMMAND_COUNT} commands in one session")
+    await benchmark_commands("handshake", streaming=False)
+    await benchmark_commands("streaming", streaming=True)
+
+    print(f"{BATCH_SIZE} commands, separately and batched")
+    await benchmark_batch("separate", batched=False)
+    await benchmark_batch("batch", batched=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
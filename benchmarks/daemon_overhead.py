@@ -0,0 +1,74 @@
+import os
+import timeit
+import tempfile
+import threading
+from msband.cache import DeviceCache
+from msband.static.command import Command, GetPcbId, GetProductSerialNumber, EFlashRead
+from msband.protocol import ProtocolInterface
+from msband.multiplexer import CommandMultiplexer
+from msband.daemon import BandDaemon, DaemonInterface
+
+SUCCESS = bytes.fromhex("FEA600000000")
+
+
+class InstantBand(ProtocolInterface):
+    # Answers every command with zeroes straight away, so only the software overhead is timed
+    __slots__ = "incoming"
+
+    def __init__(self):
+        super().__init__()
+        self.incoming = memoryview(b"")
+
+    def send(self, data: bytes, raw: bool) -> int:
+        if not raw:
+            command = Command.from_bytes[bytes(data[2:4])]
+            data_length = int.from_bytes(data[4:8], "little")
+            response = bytearray(data_length) + SUCCESS
+            if command is GetProductSerialNumber:
+                response[:12] = b"000000000000"
+            self.incoming = memoryview(response)
+        return len(data)
+
+    def read_into(self, buffer: memoryview) -> int:
+        count = min(len(buffer), len(self.incoming))
+        buffer[:count] = self.incoming[:count]
+        self.incoming = self.incoming[count:]
+        return count
+
+
+def benchmark(label: str, call):
+    loops, total = timeit.Timer(call).autorange()
+    print(f"{label:>24}: {total / loops * 1e6:10.3f} us")
+
+
+if __name__ == "__main__":
+    path = os.path.join(tempfile.mkdtemp(), "msband.sock")
+
+    direct = InstantBand()
+    multiplexer = CommandMultiplexer(InstantBand())
+
+    daemon = BandDaemon({"band": InstantBand()}, path)
+    threading.Thread(target=daemon.serve_forever, daemon=True).start()
+    client = DaemonInterface(path=path)
+
+    cached_path = os.path.join(tempfile.mkdtemp(), "msband.sock")
+    cached_daemon = BandDaemon({"band": InstantBand()}, cached_path, cache=DeviceCache(None))
+    threading.Thread(target=cached_daemon.serve_forever, daemon=True).start()
+    cached_client = DaemonInterface(path=cached_path)
+
+    print("GetPcbId")
+    benchmark("direct", lambda: direct.command(GetPcbId))
+    benchmark("multiplexer", lambda: multiplexer.command(GetPcbId).result())
+    benchmark("daemon", lambda: client.command(GetPcbId))
+    benchmark("daemon, cached", lambda: cached_client.command(GetPcbId))
+
+    print("EFlashRead 1 MiB stream")
+    stream = dict(Address=0, DataLength=1 << 20)
+    benchmark("direct", lambda: sum(map(len, direct.command_stream(EFlashRead, **stream))))
+    benchmark("daemon", lambda: sum(map(len, client.command_stream(EFlashRead, **stream))))
+
+    multiplexer.close()
+    daemon.server.shutdown()
+    daemon.close()
+    cached_daemon.server.shutdown()
+    cached_daemon.close()
@@ -0,0 +1,33 @@
+import sys
+import statistics
+import subprocess
+
+MODULES = ["msband.static", "msband.static.command", "msband.protocol"]
+RUNS = 15
+
+PROBE = """
+import sys, time
+started = time.perf_counter()
+import {module}
+print(time.perf_counter() - started, "PIL" in sys.modules)
+"""
+
+
+def import_time(module: str):
+    # Fresh interpreter each run, construct and friends included in the figure
+    timings = []
+    for _ in range(RUNS):
+        output = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module)],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.split()
+        timings.append(float(output[0]))
+    return statistics.median(timings), output[1] == "True"
+
+
+if __name__ == "__main__":
+    for module in MODULES:
+        median, pil = import_time(module)
+        print(f"{module:>24}: {median * 1e3:8.1f} ms  {'(PIL loaded)' if pil else ''}")
@@ -0,0 +1,63 @@
+import time
+import random
+import struct
+from msband.static import SensorType
+from msband.logs import RECORD_HEADER, decode_chunks, decode_columns, sample_dtype
+
+RECORDS = 5000
+SAMPLES_PER_RECORD = 16
+CHUNK_SIZE = 4096
+
+
+def synthetic_log() -> bytes:
+    # AccelGyro records, a LogEntry every 100 of them and some other records in between
+    sample = sample_dtype(SensorType.AccelGyro_2_4_MS_16G).itemsize
+    log = bytearray()
+
+    for index in range(RECORDS):
+        if index % 100 == 0:
+            payload = struct.pack("<Q", 133_000_000_000_000_000 + index * 10_000_000)
+            log += RECORD_HEADER.pack(SensorType.LogEntry.value, 0, len(payload)) + payload
+        if index % 10 == 0:
+            payload = random.randbytes(12)
+            log += RECORD_HEADER.pack(SensorType.BatteryGauge.value, 0, len(payload)) + payload
+
+        payload = random.randbytes(sample * SAMPLES_PER_RECORD)
+        log += RECORD_HEADER.pack(SensorType.AccelGyro_2_4_MS_16G.value, 0, len(payload))
+        log += payload
+
+    return bytes(log)
+
+
+def chunks(log: bytes):
+    return [log[offset : offset + CHUNK_SIZE] for offset in range(0, len(log), CHUNK_SIZE)]
+
+
+def construct_decoder(log: bytes) -> int:
+    samples = 0
+    for record in decode_chunks(chunks(log)):
+        if record.type is SensorType.AccelGyro_2_4_MS_16G:
+            samples += len(record.parse())
+    return samples
+
+
+def columnar_decoder(log: bytes) -> int:
+    columns = decode_columns(chunks(log), SensorType.AccelGyro_2_4_MS_16G)
+    return len(columns["AccelX"])
+
+
+def benchmark(label: str, decoder, log: bytes) -> int:
+    started = time.perf_counter()
+    samples = decoder(log)
+    elapsed = time.perf_counter() - started
+    print(f"{label:>10}: {samples / elapsed:14,.0f} samples/s ({elapsed * 1e3:.1f} ms)")
+    return samples
+
+
+if __name__ == "__main__":
+    random.seed(0)
+    log = synthetic_log()
+    print(f"{len(log) / 1024 / 1024:.1f} MiB, {RECORDS * SAMPLES_PER_RECORD:,} samples")
+
+    assert benchmark("construct", construct_decoder, log) == RECORDS * SAMPLES_PER_RECORD
+    assert benchmark("columnar", columnar_decoder, log) == RECORDS * SAMPLES_PER_RECORD
@@ -0,0 +1,51 @@
+import timeit
+from construct import Pass
+from msband.static.command import GetPcbId, SRAMFWUpdateLoadData
+from msband.protocol.core import Exchange, Send, Need, parse_result
+
+
+OK = bytes.fromhex("FEA600000000")
+PCB_ID = GetPcbId.Response.build(26) + OK
+
+
+def exchange(packet, response_length, transfer, reply) -> bytes:
+    # Drives an Exchange the way a transport would, the "device" answers from reply
+    exchange = Exchange(packet, response_length, transfer, window=64)
+
+    while True:
+        event = exchange.next_event()
+        if isinstance(event, Send):
+            exchange.sent(len(event.data))
+        elif isinstance(event, Need):
+            count = len(event.buffer)
+            event.buffer[:] = reply[:count]
+            reply = reply[count:]
+            exchange.received(count)
+        else:
+            return event.response, event.status
+
+
+def get_pcb_id():
+    result_bytes, status = exchange(*GetPcbId.build_command_packet(), PCB_ID)
+    return parse_result(GetPcbId, result_bytes, status)
+
+
+def load_data(payload: bytes):
+    packet, response_length, transfer = SRAMFWUpdateLoadData.build_command_packet(
+        UpdateFileStream=payload, Response=Pass
+    )
+    return exchange(packet, response_length, transfer, OK)[1]
+
+
+def benchmark(label: str, call):
+    loops, total = timeit.Timer(call).autorange()
+    print(f"{label:>24}: {total / loops * 1e6:10.2f} us")
+
+
+if __name__ == "__main__":
+    assert get_pcb_id() == 26
+
+    payload = bytes(4096)
+    benchmark("GetPcbId round trip", get_pcb_id)
+    benchmark("GetPcbId build", GetPcbId.build_command_packet)
+    benchmark("4 KB transfer, 64 B MTU", lambda: load_data(payload))
@@ -0,0 +1,26 @@
+import timeit
+from msband.static.status import Status, StatusPacket, parse_status
+
+
+def trailer(status: Status) -> memoryview:
+    customer, severity, facility, code = status.value
+    return memoryview(
+        StatusPacket.build(
+            dict(Code=code, Facility=facility, Reserved=customer << 2, Severity=int(severity))
+        )
+    )
+
+
+def benchmark(label: str, call):
+    loops, total = timeit.Timer(call).autorange()
+    print(f"{label:>12}: {total / loops * 1e6:10.3f} us")
+
+
+if __name__ == "__main__":
+    for status in (Status.Success, Status.DmaChannelBusy, Status.VoicePushAirplaneMode):
+        data = trailer(status)
+        assert StatusPacket.parse(data).Status is parse_status(data) is status
+
+        print(status.name)
+        benchmark("StatusPacket", lambda: StatusPacket.parse(data).Status)
+        benchmark("index", lambda: parse_status(data))
@@ -0,0 +1,56 @@
+import array
+import timeit
+from usb import _interop
+from msband.sugar import bites
+from msband.protocol import USBInterface
+
+
+MTU = 64
+PAYLOAD_SIZES = {"1 KB": 1 << 10, "64 KB": 64 << 10, "4 MB": 4 << 20}
+
+
+class BulkOutEndpoint:
+    # Stands in for usb.core.Endpoint, converting the payload the same way PyUSB does
+    wMaxPacketSize = MTU
+
+    def write(self, data) -> int:
+        return len(_interop.as_array(data))
+
+
+def legacy_send(iband: USBInterface, data: bytes) -> int:
+    written = 0
+
+    for data_slice in bites(data, iband.mtu):
+        written += iband.bulk_out.write(b"" + bytearray(data_slice))
+
+    return written
+
+
+def framed_interface(coalesce: bool) -> USBInterface:
+    iband = USBInterface(coalesce=coalesce)
+    iband.bulk_out = BulkOutEndpoint()
+    iband.mtu = MTU
+    iband.frame = array.array("B", bytes(MTU))
+    return iband
+
+
+def benchmark(label: str, send, payload: bytes):
+    loops, total = timeit.Timer(lambda: send(payload)).autorange()
+    per_call = total / loops
+    print(f"{label:>12}: {per_call * 1e3:10.3f} ms  {len(payload) / per_call / 2**20:10.1f} MiB/s")
+
+
+if __name__ == "__main__":
+    per_packet = framed_interface(coalesce=False)
+    coalesced = framed_interface(coalesce=True)
+
+    for size_name, size in PAYLOAD_SIZES.items():
+        payload = bytes(range(256)) * (size // 256)
+        assert (
+            legacy_send(per_packet, payload) == per_packet.send(payload) == coalesced.send(payload)
+        )
+
+        print(f"{size_name} payload")
+        benchmark("bites", lambda data: legacy_send(per_packet, data), payload)
+        benchmark("memoryview", per_packet.send, payload)
+        benchmark("coalesced", coalesced.send, payload)
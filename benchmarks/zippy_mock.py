@@ -0,0 +1,142 @@
+import uuid
+import asyncio
+import construct
+from msband.protocol import APP_ID
+from msband.static.command import Command, COMMAND_PACKET
+from msband.protocol.zippy import (
+    ZippyLockPacket,
+    ZippyLockPacketStruct,
+    ZippyControlPacket,
+    ZippyControlPacketStruct,
+    ZIPPY_LOCK,
+    ZIPPY_MAX_ALIGNED,
+    ZIPPY_W_BUFFER,
+    ZIPPY_R_BUFFER,
+    ZIPPY_R_CONTROL,
+    ZIPPY_W_CONTROL,
+    ZIPPY_R1,
+    ZIPPY_R2,
+    ZIPPY_W1,
+    ZIPPY_W2,
+)
+
+SUCCESS = bytes.fromhex("FEA600000000")
+
+
+class MockZippyClient:
+    # Plays the Band side of Zippy well enough to drive BLEv2Interface without a radio
+
+    def __init__(self, responder, max_aligned=20, credits=8, interval=0.0, swap=False):
+        self.responder = responder
+        self.max_aligned = max_aligned
+        self.credits = credits
+        self.free = credits
+        self.interval = interval
+        self.swap = swap
+        self.handlers = {}
+        self.incoming = bytearray()
+        self.writes = {"response": 0, "no_response": 0, "control": 0, "lock": 0, "read": 0}
+
+    async def connect(self, **kwargs):
+        return True
+
+    async def start_notify(self, characteristic, callback):
+        self.handlers[characteristic] = callback
+
+    def notify(self, characteristic, data):
+        callback = self.handlers.get(characteristic)
+        if callback is not None:
+            asyncio.ensure_future(callback(0, bytearray(data)))
+
+    async def read_gatt_char(self, characteristic):
+        self.writes["read"] += 1
+        await asyncio.sleep(self.interval * 2)
+        if characteristic == ZIPPY_MAX_ALIGNED:
+            return bytearray(construct.Int16ul.build(self.max_aligned))
+        if characteristic == ZIPPY_W_BUFFER:
+            return bytearray(construct.Int16ul.build(self.credits))
+        raise KeyError(characteristic)
+
+    async def write_gatt_char(self, characteristic, data, response=False):
+        data = bytes(data)
+        if response:
+            self.writes["response"] += 1
+            await asyncio.sleep(self.interval * 2)
+        else:
+            self.writes["no_response"] += 1
+            await asyncio.sleep(self.interval / 4)
+
+        if characteristic == ZIPPY_LOCK:
+            self.writes["lock"] += 1
+            lock = ZippyLockPacketStruct.parse(data)
+            app_id = APP_ID if lock.Lock else uuid.UUID(int=0)
+            self.notify(
+                ZIPPY_LOCK,
+                ZippyLockPacketStruct.build(ZippyLockPacket(AppID=app_id, Lock=lock.Lock)),
+            )
+
+        elif characteristic in (ZIPPY_W1, ZIPPY_W2):
+            fragment_length = data[1]
+            self.incoming.extend(data[2 : 2 + fragment_length])
+            if not response:
+                self.free -= 1
+                if self.free < 0:
+                    raise RuntimeError("Zippy RX buffer overrun")
+                if not self.free:
+                    self.free = self.credits
+                    self.notify(ZIPPY_W_BUFFER, construct.Int16ul.build(self.credits))
+
+        elif characteristic == ZIPPY_R_CONTROL:
+            self.writes["control"] += 1
+            self.free = self.credits
+            self.notify(ZIPPY_R_CONTROL, b"\x01")
+            self.maybe_respond()
+
+        elif characteristic == ZIPPY_R_BUFFER:
+            pass
+
+    def maybe_respond(self):
+        if len(self.incoming) < 8:
+            return
+        header = construct.Struct(
+            "Magic" / construct.Const(COMMAND_PACKET, construct.Int16ul),
+            "Command" / construct.Bytes(2),
+            "DataLength" / construct.Int32ul,
+        ).parse(self.incoming)
+        command = Command.from_bytes[header.Command]
+        arguments_length = sum(subcon.sizeof() for subcon in (command.Arguments or {}).values())
+        transfer_length = 0 if command.Transferless else header.DataLength
+        total = 8 + arguments_length + transfer_length
+        if len(self.incoming) < total:
+            return
+
+        arguments = bytes(self.incoming[8 : 8 + arguments_length])
+        transfer = bytes(self.incoming[8 + arguments_length : total])
+        del self.incoming[:total]
+
+        response = self.responder(command, arguments, transfer)
+        self.send_message(response, SUCCESS)
+
+    def send_message(self, response: bytes, status: bytes):
+        self.notify(
+            ZIPPY_W_CONTROL,
+            ZippyControlPacketStruct.build(ZippyControlPacket(Length=len(response) + len(status))),
+        )
+        chunks = [
+            response[i : i + self.max_aligned] for i in range(0, len(response), self.max_aligned)
+        ]
+        if chunks:
+            chunks[-1] += status
+        else:
+            chunks = [status]
+
+        fragments = [
+            (ZIPPY_R1 if fragment_id % 2 == 0 else ZIPPY_R2, bytes([fragment_id % 256]) + chunk)
+            for fragment_id, chunk in enumerate(chunks)
+        ]
+        if self.swap:
+            for i in range(0, len(fragments) - 1, 2):
+                fragments[i], fragments[i + 1] = fragments[i + 1], fragments[i]
+
+        for characteristic, fragment in fragments:
+            self.notify(characteristic, fragment)
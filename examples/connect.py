@@ -17,5 +17,16 @@ BLUETOOTH_MAC_ADDRESS = "00:00:00:00:00:00"
 iband = BLEv2Interface()
 await iband.acquire(BLUETOOTH_MAC_ADDRESS)
 
+# %%
+from msband.protocol import AsyncUSBInterface
+iband = AsyncUSBInterface()
+await iband.acquire()
+
+# %%
+from msband.protocol import AsyncBluetoothInterface
+BLUETOOTH_MAC_ADDRESS = "00:00:00:00:00:00"
+iband = AsyncBluetoothInterface()
+await iband.acquire(BLUETOOTH_MAC_ADDRESS)
+
 # %%
 from msband.static.command import *
@@ -0,0 +1,18 @@
+import collections
+from msband.logs import decode_files, log_files
+from msband.static import SensorType
+
+
+# A folder synced by sync_logs.py
+sync_folder = "Sync/..."
+
+
+# Records split between two .log files decode as one
+counts = collections.Counter()
+for record in decode_files(log_files(sync_folder)):
+    counts[record.type] += 1
+
+    if record.type is SensorType.LogEntry:
+        print(record.time, record.parse().Data)
+
+print(counts)
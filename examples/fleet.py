@@ -0,0 +1,15 @@
+from msband.fleet import BandFleet
+from msband.static.command import *
+
+
+# Claim every Band plugged into this machine, plus any paired over Bluetooth
+fleet = BandFleet(workers=8)
+fleet.discover(rfcomm_addresses=[])
+
+
+# Results arrive as each Band answers
+for result in fleet.run(lambda iband: iband.command(GetProductSerialNumber)):
+    if result.ok:
+        print(f"{result.device}: {result.result} ({result.latency * 1000:.0f} ms)")
+    else:
+        print(f"{result.device}: failed with {result.error!r}")
@@ -0,0 +1,19 @@
+import asyncio
+from msband.fleet import BandFleet
+from msband.static.command import *
+
+
+async def main():
+    # Same as fleet.py, with Async interfaces so every Band is driven from one event loop
+    fleet = BandFleet(workers=8)
+    await fleet.adiscover(rfcomm_addresses=[])
+
+    # A lambda returning a coroutine is awaited just like a coroutine function
+    async for result in fleet.arun(lambda iband: iband.command(GetProductSerialNumber)):
+        if result.ok:
+            print(f"{result.device}: {result.result} ({result.latency * 1000:.0f} ms)")
+        else:
+            print(f"{result.device}: failed with {result.error!r}")
+
+
+asyncio.run(main())
@@ -1,37 +1,29 @@
-import math
+import logging
 import pathlib
 from msband.static.command import *
 from msband.protocol import ProtocolInterface
+from msband.sync import LogSync
+from msband.cache import DeviceCache
 
 
 # Connect using your preferred interface
 iband : ProtocolInterface = ...
+iband.cache = DeviceCache()  # remembers the batch size that suited this Band
 
 
 device_serial = iband.command(GetProductSerialNumber)
 sync_folder = pathlib.Path('Sync').joinpath(device_serial)
-sync_folder.mkdir(parents=True, exist_ok=True)
 
 
 # Synchronise logs
-remaining_logdata_chunks = iband.command(LoggerGetChunkCounts).LoggedChunkCount
-for i in range(math.ceil(remaining_logdata_chunks/128.)):
-    chunk_meta = iband.command(LoggerGetChunkRangeMetadata, ChunkCount=128)
-
-    chunk_data = iband.command(
-        LoggerGetChunkRangeData,
-        StartingSeqNumber=chunk_meta.StartingSeqNumber,
-        EndingSeqNumber=chunk_meta.EndingSeqNumber,
-        DataLength=chunk_meta.ByteCount,
-    )
-
-    sync_folder.joinpath(
-        f"{chunk_meta.StartingSeqNumber}-{chunk_meta.EndingSeqNumber}.log"
-    ).write_bytes(chunk_data)
-
-    iband.command(
-        LoggerDeleteChunkRange,
-        StartingSeqNumber=chunk_meta.StartingSeqNumber,
-        EndingSeqNumber=chunk_meta.EndingSeqNumber,
-        ByteCount=chunk_meta.ByteCount,
-    )
\ No newline at end of file
+# Each range is deleted from the Band only once its file is safely on disk
+logging.basicConfig(level=logging.INFO)
+report = LogSync(
+    iband,
+    sync_folder,
+    progress=lambda progress: print(
+        f"{progress.chunks} chunks, {progress.chunks_per_second:.1f} chunks/s, "
+        f"batches of {progress.chunk_count}, "
+        f"{progress.bytes_per_second / 1024:.1f} KiB/s"
+    ),
+).run()
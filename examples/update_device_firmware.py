@@ -1,17 +1,25 @@
+import mmap
 import time
 import pathlib
 from msband.static.command import *
 from msband.static import FirmwareApp
-from msband.protocol import ProtocolInterface
+from msband.protocol import ProtocolInterface, TransferProgress
 
 
 # Connect using your preferred interface
 iband: ProtocolInterface = ...
 
 
+def report(progress: TransferProgress):
+    print(
+        f"{progress.transferred}/{progress.total} bytes"
+        f" @ {progress.throughput / 1024:.1f} KiB/s",
+        end="\r",
+    )
+
+
 firmware_path = pathlib.Path("envoy-2.0.5202.0.bin")
 firmware_size = firmware_path.stat().st_size
-firmware_bytes = firmware_path.read_bytes()
 
 iband.command(SRAMFWUpdateBootIntoUpdateMode)
 time.sleep(5)
@@ -20,8 +28,12 @@ time.sleep(5)
 iband.reacquire()
 
 assert int(iband.command(CoreModuleWhoAmI)) == FirmwareApp.UpApp
-iband.command(
-    SRAMFWUpdateLoadData,
-    UpdateFileStream=firmware_bytes,
-    DataLength=firmware_size,
-)
+with firmware_path.open("rb") as firmware_file:
+    with mmap.mmap(firmware_file.fileno(), 0, access=mmap.ACCESS_READ) as firmware_bytes:
+        iband.command(
+            SRAMFWUpdateLoadData,
+            UpdateFileStream=firmware_bytes,
+            DataLength=firmware_size,
+            Response=Pass,
+            Progress=report,
+        )
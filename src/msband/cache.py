@@ -0,0 +1,143 @@
+import os
+import json
+import time
+import typing
+import logging
+import pathlib
+import threading
+from msband.static.command import Command, CoreModuleGetVersion
+
+
+DEFAULT_PATH = pathlib.Path.home() / ".cache" / "msband" / "devices.json"
+DEFAULT_TTL = 7 * 24 * 60 * 60  # seconds
+
+
+class DeviceCache:
+    # Responses of Immutable commands per device serial, plus which transport address is which
+    # serial, so a reconnect can answer identity queries without talking to the Band
+    __slots__ = "path", "ttl", "aliases", "devices", "loaded", "lock"
+
+    def __init__(
+        self,
+        path: typing.Optional[typing.Union[str, os.PathLike]] = DEFAULT_PATH,
+        ttl: float = DEFAULT_TTL,
+    ):
+        self.path = None if path is None else pathlib.Path(path)  # None keeps it in memory
+        self.ttl = ttl
+        self.aliases: typing.Dict[str, str] = {}
+        self.devices: typing.Dict[str, typing.Dict[str, typing.Any]] = {}
+        self.loaded = False
+        self.lock = threading.RLock()
+
+    def load(self) -> None:
+        with self.lock:
+            self.loaded = True
+            if self.path is None or not self.path.exists():
+                return
+
+            try:
+                state = json.loads(self.path.read_text())
+                self.aliases = dict(state["aliases"])
+                self.devices = dict(state["devices"])
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                logging.warning(f"Ignoring unreadable device cache {self.path}: {e}")
+                self.aliases = {}
+                self.devices = {}
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+
+        with self.lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            temporary = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+            temporary.write_text(json.dumps({"aliases": self.aliases, "devices": self.devices}))
+            os.replace(temporary, self.path)
+
+    def device(self, serial: str) -> typing.Optional[typing.Dict[str, typing.Any]]:
+        if not self.loaded:
+            self.load()
+
+        device = self.devices.get(serial)
+        if device is not None and time.time() - device["stored"] > self.ttl:
+            self.forget(serial)
+            return None
+        return device
+
+    def serial_for(self, identity: typing.Optional[str]) -> typing.Optional[str]:
+        if identity is None:
+            return None
+
+        with self.lock:
+            if not self.loaded:
+                self.load()
+
+            serial = self.aliases.get(identity)
+            if serial is not None and self.device(serial) is None:
+                return None
+            return serial
+
+    def alias(self, identity: typing.Optional[str], serial: str) -> None:
+        with self.lock:
+            if not self.loaded:
+                self.load()
+
+            self.devices.setdefault(serial, {"stored": time.time(), "responses": {}})
+            if identity is not None and self.aliases.get(identity) != serial:
+                self.aliases[identity] = serial
+            self.save()
+
+    def lookup(self, serial: str, command: Command) -> typing.Optional[bytes]:
+        with self.lock:
+            device = self.device(serial)
+            if device is None:
+                return None
+
+            response = device["responses"].get(command.Name)
+            return None if response is None else bytes.fromhex(response)
+
+    def store(self, serial: str, command: Command, result_bytes: bytes) -> None:
+        with self.lock:
+            device = self.device(serial)
+            if device is None:
+                device = self.devices[serial] = {"stored": time.time(), "responses": {}}
+
+            responses = device["responses"]
+
+            # Everything else was answered by the previous firmware
+            if command is CoreModuleGetVersion:
+                previous = responses.get(command.Name)
+                if previous is not None and previous != result_bytes.hex():
+                    logging.info(f"Firmware of {serial} changed, dropping its cached responses")
+                    responses.clear()
+
+            responses[command.Name] = result_bytes.hex()
+            self.save()
+
+    def setting(self, serial: str, key: str) -> typing.Any:
+        # Learnt per device, like tuning; kept across firmware versions, unlike responses
+        with self.lock:
+            device = self.device(serial)
+            if device is None:
+                return None
+            return device.get("settings", {}).get(key)
+
+    def store_setting(self, serial: str, key: str, value: typing.Any) -> None:
+        with self.lock:
+            device = self.device(serial)
+            if device is None:
+                device = self.devices[serial] = {"stored": time.time(), "responses": {}}
+
+            settings = device.setdefault("settings", {})
+            if settings.get(key) != value:
+                settings[key] = value
+                self.save()
+
+    def forget(self, serial: typing.Optional[str]) -> None:
+        with self.lock:
+            if self.devices.pop(serial, None) is None:
+                return
+
+            for identity in [i for i, s in self.aliases.items() if s == serial]:
+                del self.aliases[identity]
+            self.save()
@@ -0,0 +1,383 @@
+import os
+import sys
+import stat
+import struct
+import typing
+import socket
+import logging
+import argparse
+import tempfile
+import threading
+import socketserver
+from msband.cache import DeviceCache
+from msband.static.command import Command
+from msband.static.status import Status, STATUS_INDEX, status_word
+from msband.protocol import ProtocolInterface, StatusError
+from msband.protocol.core import StreamExchange, ProgressCallback, resolve_command
+from msband.multiplexer import CommandMultiplexer, Priority
+
+
+DEFAULT_SOCKET = os.path.join(
+    os.environ.get("XDG_RUNTIME_DIR", tempfile.gettempdir()), "msband.sock"
+)
+
+# Every frame: kind, request id, payload length
+FRAME = struct.Struct("<BHI")
+
+# Request payload: priority, device name length, packet length, response length, stream chunk size,
+# then the device name, the command packet and whatever is left is the transfer
+REQUEST = struct.Struct("<BBHII")
+
+# Response payload: status word, then the result bytes
+RESULT = struct.Struct("<I")
+
+PACKET_HEADER_LENGTH = 8
+
+COMMAND = 1  # client -> daemon
+STREAM = 2  # client -> daemon
+RESPONSE = 3  # daemon -> client, answers COMMAND
+CHUNK = 4  # daemon -> client, part of a STREAM answer
+END = 5  # daemon -> client, closes a STREAM answer with its status
+ERROR = 6  # daemon -> client, payload is the error message
+
+
+class DaemonError(Exception):
+    ...
+
+
+def recv_exactly(sock: socket.socket, length: int) -> typing.Optional[bytearray]:
+    data = bytearray(length)
+    view = memoryview(data)
+    received = 0
+
+    while received < length:
+        count = sock.recv_into(view[received:])
+        if not count:
+            return None  # peer went away
+        received += count
+
+    return data
+
+
+def recv_frame(sock: socket.socket) -> typing.Optional[typing.Tuple[int, int, bytearray]]:
+    header = recv_exactly(sock, FRAME.size)
+    if header is None:
+        return None
+
+    kind, request_id, length = FRAME.unpack(header)
+    payload = recv_exactly(sock, length)
+    if payload is None:
+        return None
+
+    return kind, request_id, payload
+
+
+def send_frame(sock: socket.socket, kind: int, request_id: int, *parts) -> None:
+    length = sum(len(part) for part in parts)
+    sock.sendmsg([FRAME.pack(kind, request_id, length), *parts])
+
+
+def remove_stale_socket(path: str) -> None:
+    # Only a socket nobody answers on is removed, a running daemon keeps its own
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except FileNotFoundError:
+        return
+    except ConnectionRefusedError:
+        if stat.S_ISSOCK(os.lstat(path).st_mode):
+            os.unlink(path)  # left behind by a daemon that didn't shut down cleanly
+        return
+    finally:
+        probe.close()
+
+    raise DaemonError(f"Another msband daemon is serving {path}")
+
+
+class DaemonHandler(socketserver.BaseRequestHandler):
+    # One thread per client, the device work itself happens on each Band's multiplexer thread
+    def handle(self) -> None:
+        daemon: "BandDaemon" = self.server.band_daemon
+        send_lock = threading.Lock()
+
+        def reply(kind: int, request_id: int, *parts) -> None:
+            # A client that went away mustn't stop its stream halfway, the Band still has to be read
+            with send_lock:
+                try:
+                    send_frame(self.request, kind, request_id, *parts)
+                except OSError as e:
+                    logging.debug(f"Dropped reply to {request_id}: {e}")
+
+        while True:
+            frame = recv_frame(self.request)
+            if frame is None:
+                return
+
+            kind, request_id, payload = frame
+            try:
+                daemon.dispatch(kind, request_id, payload, reply)
+            except Exception as e:
+                reply(ERROR, request_id, f"{type(e).__name__}: {e}".encode())
+
+
+class BandDaemon:
+    # Owns the Bands so several processes can share them through a Unix socket
+    __slots__ = "path", "multiplexers", "server"
+
+    def __init__(
+        self,
+        bands: typing.Dict[str, ProtocolInterface],
+        path: str = DEFAULT_SOCKET,
+        cache: typing.Optional[DeviceCache] = None,
+    ):
+        remove_stale_socket(path)
+
+        self.path = path
+        self.multiplexers: typing.Dict[str, CommandMultiplexer] = {}
+
+        for name, iband in bands.items():
+            if cache is not None:
+                iband.cache = cache
+            self.multiplexers[name] = CommandMultiplexer(iband, name=f"msband-io-{name}")
+
+        self.server = socketserver.ThreadingUnixStreamServer(path, DaemonHandler)
+        self.server.daemon_threads = True
+        self.server.band_daemon = self
+
+    def serve_forever(self) -> None:
+        try:
+            self.server.serve_forever()
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        self.server.server_close()
+        for multiplexer in self.multiplexers.values():
+            multiplexer.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def dispatch(self, kind: int, request_id: int, payload: bytearray, reply) -> None:
+        priority, name_length, packet_length, response_length, chunk_size = REQUEST.unpack_from(
+            payload
+        )
+        view = memoryview(payload)[REQUEST.size :]
+        name = bytes(view[:name_length]).decode()
+        packet = bytes(view[name_length : name_length + packet_length])
+        transfer = view[name_length + packet_length :] or None
+
+        if not name and len(self.multiplexers) == 1:
+            (multiplexer,) = self.multiplexers.values()
+        else:
+            multiplexer = self.multiplexers[name]
+
+        if kind == COMMAND:
+
+            def operation(iband: ProtocolInterface):
+                return self.execute(iband, packet, response_length, transfer)
+
+            def done(future) -> None:
+                try:
+                    result_bytes, status = future.result()
+                except Exception as e:
+                    reply(ERROR, request_id, f"{type(e).__name__}: {e}".encode())
+                else:
+                    reply(RESPONSE, request_id, RESULT.pack(status_word(status)), result_bytes)
+
+            multiplexer.submit(operation, priority).add_done_callback(done)
+
+        elif kind == STREAM:
+
+            def operation(iband: ProtocolInterface):
+                # Chunks go out from the I/O thread as they arrive, a slow client slows the stream
+                exchange = StreamExchange(
+                    packet, response_length, transfer, iband.window, chunk_size=chunk_size
+                )
+                try:
+                    for chunk in iband.drive_stream(exchange):
+                        reply(CHUNK, request_id, chunk)
+                except StatusError as e:
+                    reply(END, request_id, RESULT.pack(status_word(e.args[0])))
+                else:
+                    reply(END, request_id, RESULT.pack(status_word(Status.Success)))
+
+            def failed(future) -> None:
+                if future.exception() is not None:
+                    e = future.exception()
+                    reply(ERROR, request_id, f"{type(e).__name__}: {e}".encode())
+
+            multiplexer.submit(operation, priority).add_done_callback(failed)
+
+        else:
+            raise ValueError(f"Unknown frame kind {kind}")
+
+    @staticmethod
+    def execute(
+        iband: ProtocolInterface, packet: bytes, response_length: int, transfer
+    ) -> typing.Tuple[bytes, Status]:
+        # Immutable answers are shared between every client, and survive their reconnects
+        # The packet is magic, command, data length, then arguments: only argument-less ones count
+        if iband.cache is None or transfer or len(packet) > PACKET_HEADER_LENGTH:
+            return iband.communicate(packet, response_length, transfer)
+
+        command = Command.from_bytes.get(bytes(packet[2:4]))
+        if command is None or not command.Immutable:
+            return iband.communicate(packet, response_length, transfer)
+
+        serial = iband.device_serial()
+        cached = iband.cache.lookup(serial, command)
+        if cached is not None:
+            return cached, Status.Success
+
+        result_bytes, status = iband.communicate(packet, response_length)
+        if status is Status.Success:
+            iband.cache.store(serial, command, bytes(result_bytes))
+        return result_bytes, status
+
+
+class DaemonInterface(ProtocolInterface):
+    # A ProtocolInterface whose Band lives in an msband daemon
+    __slots__ = "socket", "priority", "request_id"
+
+    def __init__(self, id: typing.Optional[str] = None, path: str = DEFAULT_SOCKET, **kwargs):
+        super().__init__()
+        self.socket: typing.Optional[socket.socket] = None
+        self.priority = Priority.Normal
+        self.request_id = 0
+        self.acquire(id, path, **kwargs)
+
+    def acquire(
+        self,
+        id: typing.Optional[str] = None,
+        path: str = DEFAULT_SOCKET,
+        priority: int = Priority.Normal,
+        **kwargs,
+    ) -> None:
+        ProtocolInterface.acquire(**vars())  # ugly
+
+        if self.socket is not None:
+            self.socket.close()
+
+        self.priority = priority
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(path)
+
+    def request(
+        self,
+        kind: int,
+        data: bytes,
+        response_length: int,
+        transfer: typing.Optional[bytes] = None,
+        chunk_size: int = 0,
+    ) -> int:
+        self.request_id = (self.request_id + 1) & 0xFFFF
+        name = (self.acquire_vars.get("id") or "").encode()
+
+        header = REQUEST.pack(self.priority, len(name), len(data), response_length, chunk_size)
+        send_frame(
+            self.socket,
+            kind,
+            self.request_id,
+            header,
+            name,
+            data,
+            b"" if transfer is None else transfer,
+        )
+        return self.request_id
+
+    def answer(self, request_id: int) -> typing.Tuple[int, bytearray]:
+        while True:
+            frame = recv_frame(self.socket)
+            if frame is None:
+                raise ConnectionError("msband daemon closed the connection")
+
+            kind, answered_id, payload = frame
+            if answered_id == request_id:
+                break
+            # Only one request is outstanding at a time, anything else is left from a stream
+            # that was dropped without being closed
+            logging.debug(f"Discarding frame {kind} of earlier request {answered_id}")
+
+        if kind == ERROR:
+            raise DaemonError(payload.decode())
+        return kind, payload
+
+    def communicate(
+        self,
+        data: bytes,
+        response_length: int,
+        transfer: bytes = None,
+        progress: typing.Optional[ProgressCallback] = None,
+    ) -> typing.Tuple[memoryview, Status]:
+        # progress can't be reported from the other side of the socket
+        kind, payload = self.answer(self.request(COMMAND, data, response_length, transfer))
+        (word,) = RESULT.unpack_from(payload)
+        return memoryview(payload)[RESULT.size :], STATUS_INDEX[word]
+
+    def command_stream(
+        self,
+        command: typing.Union[Command, str],
+        chunk_size: int = 1 << 16,
+        buffers: int = 2,
+        **kwargs,
+    ) -> typing.Iterator[memoryview]:
+        command = resolve_command(command)
+        data, response_length, transfer = command.build_command_packet(**kwargs)
+        request_id = self.request(STREAM, data, response_length, transfer, chunk_size)
+        return self.drive_daemon_stream(request_id)
+
+    def drive_daemon_stream(self, request_id: int) -> typing.Iterator[memoryview]:
+        while True:
+            kind, payload = self.answer(request_id)
+            if kind != CHUNK:
+                break
+
+            try:
+                yield memoryview(payload)
+            except BaseException:
+                # Stopped early: the rest of the stream is still coming, read past it so the
+                # next request gets its own answer (unless one was already sent)
+                if request_id == self.request_id:
+                    self.discard(request_id)
+                raise
+
+        (word,) = RESULT.unpack_from(payload)
+        status = STATUS_INDEX[word]
+        if status.value[1] != 0:
+            raise StatusError(status)
+
+    def discard(self, request_id: int) -> None:
+        try:
+            while self.answer(request_id)[0] == CHUNK:
+                pass
+        except DaemonError:
+            pass  # the stream ended in an error, nobody is waiting for it any more
+
+
+def main(argv: typing.Optional[typing.List[str]] = None) -> None:
+    from msband.fleet import BandFleet
+
+    parser = argparse.ArgumentParser(
+        prog="msband-daemon", description="Share Bands with other processes over a Unix socket"
+    )
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="path of the Unix socket")
+    parser.add_argument(
+        "--rfcomm", action="append", default=[], metavar="ADDRESS", help="Band to connect to"
+    )
+    parser.add_argument("--no-cache", action="store_true", help="don't cache immutable answers")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+
+    fleet = BandFleet()
+    fleet.discover(args.rfcomm)
+    if not fleet.bands:
+        sys.exit("No Band found")
+
+    daemon = BandDaemon(fleet.bands, args.socket, cache=None if args.no_cache else DeviceCache())
+    logging.info(f"Serving {', '.join(fleet.bands)} on {args.socket}")
+    daemon.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
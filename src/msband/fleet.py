@@ -0,0 +1,188 @@
+import time
+import typing
+import asyncio
+import logging
+import inspect
+import dataclasses
+import concurrent.futures
+from msband.static.constants import BandConstants
+from msband.protocol import (
+    ProtocolInterface,
+    USBInterface,
+    AsyncUSBInterface,
+    BluetoothInterface,
+    AsyncBluetoothInterface,
+)
+
+
+T = typing.TypeVar("T")
+
+
+@dataclasses.dataclass(frozen=True)
+class FleetResult(typing.Generic[T]):
+    device: str
+    result: typing.Optional[T]
+    error: typing.Optional[BaseException]
+    latency: float
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class BandFleet:
+    __slots__ = "bands", "latency", "workers"
+
+    def __init__(self, workers: int = 8):
+        self.bands: typing.Dict[str, ProtocolInterface] = {}
+        self.latency: typing.Dict[str, float] = {}
+        self.workers = workers
+
+    def __len__(self) -> int:
+        return len(self.bands)
+
+    def add(self, device: str, iband: ProtocolInterface) -> None:
+        self.bands[device] = iband
+
+    def usb_bands(self) -> typing.Iterator[typing.Tuple[str, "usb.core.Device"]]:
+        # Bands on USB that aren't in the fleet yet
+        import usb.core
+
+        products = {
+            (constants.UsbVendorId, constants.UsbProductId)
+            for constants in BandConstants.by_type.values()
+        }
+
+        for band in usb.core.find(
+            find_all=True, custom_match=lambda d: (d.idVendor, d.idProduct) in products
+        ):
+            device = f"usb:{band.bus}:{band.address}"
+            if device not in self.bands:
+                yield device, band
+
+    def discover(self, rfcomm_addresses: typing.Iterable[str] = ()) -> typing.List[str]:
+        # Blocking interfaces, for run(); adiscover() builds the asyncio ones for arun()
+        import usb.core
+
+        found = []
+
+        for device, band in self.usb_bands():
+            iband = USBInterface()
+            try:
+                iband.attach(band)
+            except usb.core.USBError as e:
+                logging.warning(f"Could not claim {device}: {e}")
+                continue
+
+            self.add(device, iband)
+            found.append(device)
+
+        for address in rfcomm_addresses:
+            device = f"rfcomm:{address}"
+            if device in self.bands:
+                continue
+
+            try:
+                iband = BluetoothInterface(address)
+            except OSError as e:
+                logging.warning(f"Could not connect to {device}: {e}")
+                continue
+
+            self.add(device, iband)
+            found.append(device)
+
+        return found
+
+    async def adiscover(self, rfcomm_addresses: typing.Iterable[str] = ()) -> typing.List[str]:
+        import usb.core
+
+        found = []
+
+        for device, band in self.usb_bands():
+            iband = AsyncUSBInterface()
+            try:
+                await iband.attach(band)
+            except usb.core.USBError as e:
+                logging.warning(f"Could not claim {device}: {e}")
+                continue
+
+            self.add(device, iband)
+            found.append(device)
+
+        for address in rfcomm_addresses:
+            device = f"rfcomm:{address}"
+            if device in self.bands:
+                continue
+
+            iband = AsyncBluetoothInterface()
+            try:
+                await iband.acquire(address)
+            except (OSError, asyncio.TimeoutError) as e:
+                logging.warning(f"Could not connect to {device}: {e}")
+                continue
+
+            self.add(device, iband)
+            found.append(device)
+
+        return found
+
+    def record(self, device: str, started: float, result=None, error=None) -> FleetResult:
+        latency = time.perf_counter() - started
+        self.latency[device] = latency
+        return FleetResult(device=device, result=result, error=error, latency=latency)
+
+    def call(
+        self, device: str, operation: typing.Callable[[ProtocolInterface], T]
+    ) -> FleetResult[T]:
+        started = time.perf_counter()
+        try:
+            return self.record(device, started, result=operation(self.bands[device]))
+        except Exception as e:
+            return self.record(device, started, error=e)
+
+    def run(
+        self, operation: typing.Callable[[ProtocolInterface], T]
+    ) -> typing.Generator[FleetResult[T], None, None]:
+        # Results are yielded as each device finishes, not in fleet order
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="msband-fleet"
+        ) as executor:
+            futures = [executor.submit(self.call, device, operation) for device in self.bands]
+            for future in concurrent.futures.as_completed(futures):
+                yield future.result()
+
+    async def arun(
+        self,
+        operation: typing.Callable[[ProtocolInterface], typing.Union[T, typing.Awaitable[T]]],
+    ) -> typing.AsyncGenerator[FleetResult[T], None]:
+        # Coroutine functions run on the loop, plain callables on a bounded thread pool
+        # Whatever is awaitable in the result (e.g. from a lambda or partial) is awaited on the loop
+        limit = asyncio.Semaphore(self.workers)
+        executor = None
+        if not inspect.iscoroutinefunction(operation):
+            executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="msband-fleet"
+            )
+
+        async def call(device: str) -> FleetResult[T]:
+            async with limit:
+                started = time.perf_counter()
+                try:
+                    if executor is None:
+                        result = operation(self.bands[device])
+                    else:
+                        result = await asyncio.get_running_loop().run_in_executor(
+                            executor, operation, self.bands[device]
+                        )
+                    if inspect.isawaitable(result):
+                        result = await result
+                    return self.record(device, started, result=result)
+                except Exception as e:
+                    return self.record(device, started, error=e)
+
+        try:
+            for next_result in asyncio.as_completed([call(device) for device in self.bands]):
+                yield await next_result
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False)
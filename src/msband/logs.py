@@ -0,0 +1,286 @@
+import os
+import struct
+import typing
+import functools
+import logging
+import pathlib
+import construct
+import dataclasses
+import datetime as dt
+from msband.static import SensorType, BandTime, EPOCH
+from construct import Int16sl, Int64ul, GreedyBytes, GreedyRange
+
+if typing.TYPE_CHECKING:
+    import numpy  # only needed by decode_columns, imported there when used
+
+
+# The record layout below is assumed, nothing from the Band documents it: every record is a
+# SensorType, the samples missed before it, the payload length, then the payload
+# Headers that don't fit it raise LogFormatError rather than decoding garbage
+RECORD_HEADER = struct.Struct("<BBH")
+
+# Also assumed: a record never outgrows a logger chunk
+CHUNK_SIZE = 4096
+MAX_RECORD_LENGTH = CHUNK_SIZE - RECORD_HEADER.size
+
+SENSOR_TYPES = {sensor_type.value: sensor_type for sensor_type in SensorType}
+
+
+class LogFormatError(ValueError):
+    ...
+
+
+# Payload layouts (assumed as well), types missing here are handed out as raw bytes
+AccelGyroSample = construct.Struct(
+    "AccelX" / Int16sl,
+    "AccelY" / Int16sl,
+    "AccelZ" / Int16sl,
+    "GyroX" / Int16sl,
+    "GyroY" / Int16sl,
+    "GyroZ" / Int16sl,
+)
+
+PAYLOADS: typing.Dict[SensorType, construct.Construct] = {
+    SensorType.LogEntry: construct.Struct(
+        "Timestamp" / BandTime(Int64ul),
+        "Data" / GreedyBytes,
+    ),
+    SensorType.AccelGyro_2_4_MS_16G: GreedyRange(AccelGyroSample),
+}
+
+# LogEntry records carry the time every record after them belongs to
+TIMESTAMP = struct.Struct("<Q")
+
+# Payloads that are a run of fixed-size samples must hold whole samples
+SAMPLE_SIZES = {
+    sensor_type.value: payload.subcon.sizeof()
+    for sensor_type, payload in PAYLOADS.items()
+    if isinstance(payload, GreedyRange)
+}
+
+# Shortest payload and the size it comes in multiples of, per SensorType value
+RECORD_LIMITS = {
+    value: (TIMESTAMP.size if sensor_type is SensorType.LogEntry else 0, SAMPLE_SIZES.get(value, 1))
+    for value, sensor_type in SENSOR_TYPES.items()
+}
+
+
+def check_header(sensor_type: int, length: int) -> None:
+    # A header that can't be right means the assumed layout is wrong, or the data is damaged
+    minimum, multiple = RECORD_LIMITS.get(sensor_type, (0, 0))
+    if multiple and minimum <= length <= MAX_RECORD_LENGTH and not length % multiple:
+        return
+    if sensor_type not in SENSOR_TYPES:
+        raise LogFormatError(f"Unknown SensorType {sensor_type:#04x} in a record header")
+    if length > MAX_RECORD_LENGTH:
+        raise LogFormatError(f"{length} byte record is larger than a logger chunk")
+    if length % SAMPLE_SIZES.get(sensor_type, 1):
+        raise LogFormatError(f"{length} byte {SENSOR_TYPES[sensor_type]} record splits a sample")
+    raise LogFormatError(f"{length} byte {SENSOR_TYPES[sensor_type]} record is too short")
+
+
+@dataclasses.dataclass(frozen=True)
+class LogRecord:
+    type: SensorType
+    missed: int
+    timestamp: typing.Optional[int]  # 100 ns ticks since EPOCH, of the latest LogEntry
+    payload: memoryview  # a view into the chunk it came from, copy it to outlive the chunk
+
+    @property
+    def time(self) -> typing.Optional[dt.datetime]:
+        if self.timestamp is None:
+            return None
+        return EPOCH + dt.timedelta(microseconds=self.timestamp // 10)
+
+    def parse(self) -> typing.Any:
+        payload = PAYLOADS.get(self.type)
+        if payload is None:
+            return bytes(self.payload)
+        return payload.parse(self.payload)
+
+
+class LogDecoder:
+    # Walks logger chunks record by record without copying them
+    # Only a record split between two chunks is copied, into a buffer of its own, so decoding picks
+    # up where the previous chunk stopped whatever the chunk (or file) boundaries are
+    __slots__ = "carry", "timestamp", "records"
+
+    def __init__(self):
+        self.carry: typing.Optional[bytearray] = None  # start of a record split between chunks
+        self.timestamp: typing.Optional[int] = None
+        self.records = 0
+
+    @property
+    def complete(self) -> bool:
+        # Whether the chunks so far ended on a record boundary
+        return self.carry is None
+
+    def feed(self, chunk) -> typing.Iterator[LogRecord]:
+        # Records point into chunk, it mustn't change while they're in use
+        for data in self.walk(chunk):
+            yield self.record(data)
+
+    def walk(self, chunk) -> typing.Iterator[memoryview]:
+        # Whole records, header included, for callers that don't need LogRecords
+        view = memoryview(chunk).cast("B")
+        offset = 0
+
+        if self.carry is not None:
+            offset = self.resume(view)
+            if offset is None:
+                return  # the whole chunk went into the split record
+
+            carry, self.carry = self.carry, None
+            yield memoryview(carry)
+
+        end = len(view)
+        header_size = RECORD_HEADER.size
+        unpack_from = RECORD_HEADER.unpack_from
+        limits = RECORD_LIMITS
+
+        while offset + header_size <= end:
+            sensor_type, _, length = unpack_from(view, offset)
+            # check_header() inlined, this runs for every record
+            minimum, multiple = limits.get(sensor_type, (0, 0))
+            if not multiple or length < minimum or length > MAX_RECORD_LENGTH or length % multiple:
+                check_header(sensor_type, length)
+            record_end = offset + header_size + length
+            if record_end > end:
+                break
+
+            yield view[offset:record_end]
+            offset = record_end
+
+        if offset < end:
+            self.carry = bytearray(view[offset:])
+
+    def resume(self, view: memoryview) -> typing.Optional[int]:
+        # Completes the split record from the start of view, returns where the next record starts
+        carry = self.carry
+        offset = 0
+
+        if len(carry) < RECORD_HEADER.size:
+            offset = min(RECORD_HEADER.size - len(carry), len(view))
+            carry += view[:offset]
+            if len(carry) < RECORD_HEADER.size:
+                return None
+
+        sensor_type, _, length = RECORD_HEADER.unpack_from(carry)
+        check_header(sensor_type, length)
+        size = RECORD_HEADER.size + length
+        take = min(size - len(carry), len(view) - offset)
+        carry += view[offset : offset + take]
+        if len(carry) < size:
+            return None
+        return offset + take
+
+    def record(self, data: memoryview) -> LogRecord:
+        sensor_type, missed, length = RECORD_HEADER.unpack_from(data)
+        payload = data[RECORD_HEADER.size :]
+
+        if sensor_type == SensorType.LogEntry.value:
+            (self.timestamp,) = TIMESTAMP.unpack_from(payload)
+
+        self.records += 1
+        return LogRecord(SENSOR_TYPES[sensor_type], missed, self.timestamp, payload)
+
+
+def decode_chunks(chunks: typing.Iterable) -> typing.Iterator[LogRecord]:
+    decoder = LogDecoder()
+    for chunk in chunks:
+        yield from decoder.feed(chunk)
+
+    if not decoder.complete:
+        logging.warning(f"Logs end in the middle of a record, {len(decoder.carry)} bytes left over")
+
+
+def log_files(folder: typing.Union[str, os.PathLike]) -> typing.List[pathlib.Path]:
+    # {StartingSeqNumber}-{EndingSeqNumber}.log files of a sync folder, oldest first
+    return sorted(
+        pathlib.Path(folder).glob("*-*.log"), key=lambda path: int(path.name.split("-", 1)[0])
+    )
+
+
+def read_blocks(
+    paths: typing.Iterable[typing.Union[str, os.PathLike]], block_size: int = 1 << 20
+) -> typing.Iterator[bytes]:
+    # Every block is a new object, so records from earlier blocks stay valid
+    for path in paths:
+        with open(path, "rb") as file:
+            while True:
+                block = file.read(block_size)
+                if not block:
+                    break
+                yield block
+
+
+def decode_files(
+    paths: typing.Iterable[typing.Union[str, os.PathLike]], block_size: int = 1 << 20
+) -> typing.Iterator[LogRecord]:
+    return decode_chunks(read_blocks(paths, block_size))
+
+
+@functools.lru_cache(maxsize=None)
+def sample_dtype(sensor_type: SensorType) -> "numpy.dtype":
+    # Structured dtype of one sample, from the (assumed) construct layout in PAYLOADS
+    import numpy
+
+    payload = PAYLOADS.get(sensor_type)
+    if not isinstance(payload, GreedyRange) or not isinstance(payload.subcon, construct.Struct):
+        raise ValueError(f"{sensor_type} payloads aren't a run of fixed-size samples")
+
+    fields = []
+    for subcon in payload.subcon.subcons:
+        field = subcon.subcon if isinstance(subcon, construct.Renamed) else subcon
+        if not isinstance(field, construct.FormatField):
+            raise ValueError(f"{sensor_type} sample field {subcon.name} has no fixed format")
+        fields.append((subcon.name, numpy.dtype(field.fmtstr)))
+
+    # Columns are cut from payloads the walk checked against SAMPLE_SIZES, both must agree
+    dtype = numpy.dtype(fields)
+    if dtype.itemsize != SAMPLE_SIZES[sensor_type.value]:
+        raise LogFormatError(f"{sensor_type} samples are {SAMPLE_SIZES[sensor_type.value]} bytes")
+    return dtype
+
+
+def decode_columns(
+    chunks: typing.Iterable, sensor_type: SensorType
+) -> typing.Dict[str, "numpy.ndarray"]:
+    # Every sample of one SensorType as columns, plus the Timestamp of each sample's record
+    # Records are still walked one by one, samples never become Python objects
+    # The walk checks every header, so a record always holds whole samples of the assumed size
+    import numpy
+
+    dtype = sample_dtype(sensor_type)
+    wanted = sensor_type.value
+    log_entry = SensorType.LogEntry.value
+    header_size = RECORD_HEADER.size
+
+    decoder = LogDecoder()
+    timestamp = -1  # until the first LogEntry
+    payloads: typing.List[memoryview] = []
+    timestamps: typing.List[int] = []
+    counts: typing.List[int] = []
+
+    for chunk in chunks:
+        for data in decoder.walk(chunk):
+            kind, _, length = RECORD_HEADER.unpack_from(data)
+            if kind == wanted:
+                payloads.append(data[header_size:])
+                timestamps.append(timestamp)
+                counts.append(length // dtype.itemsize)
+            elif kind == log_entry:
+                (timestamp,) = TIMESTAMP.unpack_from(data, header_size)
+
+    # One copy of the payloads, viewed in place
+    samples = numpy.frombuffer(b"".join(payloads), dtype=dtype)
+    columns = {name: samples[name] for name in dtype.names}
+
+    ticks = numpy.repeat(numpy.array(timestamps, dtype=numpy.int64), counts)
+    times = numpy.datetime64(EPOCH.replace(tzinfo=None), "us") + (ticks // 10).astype(
+        "timedelta64[us]"
+    )
+    times[ticks < 0] = numpy.datetime64("NaT")
+    columns["Timestamp"] = times
+
+    return columns
@@ -0,0 +1,150 @@
+import enum
+import time
+import queue
+import typing
+import logging
+import itertools
+import threading
+import dataclasses
+import concurrent.futures
+from msband.static.command import Command
+from msband.protocol import ProtocolInterface
+
+
+T = typing.TypeVar("T")
+
+
+class Priority(enum.IntEnum):
+    Interactive = 0
+    Normal = 10
+    Bulk = 20
+
+
+@dataclasses.dataclass(frozen=True)
+class MultiplexerMetrics:
+    depth: int
+    peak_depth: int
+    depth_by_priority: typing.Dict[int, int]
+    submitted: int
+    completed: int
+    failed: int
+    mean_wait: float  # seconds between submit() and the I/O thread picking the request up
+
+
+class CommandMultiplexer:
+    # Owns a ProtocolInterface on a single I/O thread, so commands from any thread never interleave
+    # Requests run one at a time in priority order, FIFO within a priority; a long request is not
+    # interrupted, so bulk work should be submitted in pieces to let interactive requests in between
+    __slots__ = (
+        "iband",
+        "requests",
+        "sequence",
+        "thread",
+        "lock",
+        "closed",
+        "depth",
+        "peak_depth",
+        "submitted",
+        "completed",
+        "failed",
+        "waited",
+    )
+
+    def __init__(self, iband: ProtocolInterface, name: str = "msband-io"):
+        self.iband = iband
+        self.requests = queue.PriorityQueue()
+        self.sequence = itertools.count()
+        self.lock = threading.Lock()
+        self.closed = False
+
+        self.depth: typing.Dict[int, int] = {}
+        self.peak_depth = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.waited = 0.0
+
+        self.thread = threading.Thread(target=self.serve, name=name, daemon=True)
+        self.thread.start()
+
+    def __enter__(self) -> "CommandMultiplexer":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def submit(
+        self,
+        operation: typing.Callable[[ProtocolInterface], T],
+        priority: int = Priority.Normal,
+    ) -> "concurrent.futures.Future[T]":
+        future = concurrent.futures.Future()
+
+        with self.lock:
+            if self.closed:
+                raise RuntimeError("Cannot submit to a closed CommandMultiplexer")
+
+            self.depth[priority] = self.depth.get(priority, 0) + 1
+            self.peak_depth = max(self.peak_depth, sum(self.depth.values()))
+            self.submitted += 1
+
+            # The sequence number keeps FIFO order and stops the queue from comparing futures
+            self.requests.put(
+                (priority, next(self.sequence), time.perf_counter(), future, operation)
+            )
+
+        return future
+
+    def command(
+        self, command: typing.Union[Command, str], priority: int = Priority.Normal, **kwargs
+    ) -> "concurrent.futures.Future[typing.Any]":
+        return self.submit(lambda iband: iband.command(command, **kwargs), priority)
+
+    def serve(self) -> None:
+        while True:
+            priority, _, submitted, future, operation = self.requests.get()
+            if operation is None:
+                return
+
+            with self.lock:
+                self.depth[priority] -= 1
+                self.waited += time.perf_counter() - submitted
+
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            try:
+                result = operation(self.iband)
+            except BaseException as e:
+                with self.lock:
+                    self.failed += 1
+                future.set_exception(e)
+            else:
+                with self.lock:
+                    self.completed += 1
+                future.set_result(result)
+
+    def metrics(self) -> MultiplexerMetrics:
+        with self.lock:
+            picked_up = self.submitted - sum(self.depth.values())
+            return MultiplexerMetrics(
+                depth=sum(self.depth.values()),
+                peak_depth=self.peak_depth,
+                depth_by_priority={p: d for p, d in self.depth.items() if d},
+                submitted=self.submitted,
+                completed=self.completed,
+                failed=self.failed,
+                mean_wait=self.waited / picked_up if picked_up else 0.0,
+            )
+
+    def close(self, wait: bool = True) -> None:
+        # Requests already queued still run, the sentinel sorts after every priority
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.requests.put((float("inf"), next(self.sequence), 0.0, None, None))
+
+        if wait and threading.current_thread() is not self.thread:
+            self.thread.join()
+            logging.debug(f"Multiplexer closed: {self.metrics()}")
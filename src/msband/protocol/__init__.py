@@ -1,28 +1,52 @@
 import uuid
+import array
 import typing
 import logging
 import construct
-from msband.sugar import bites, byte_bites
-from msband.static.command import Command, GetPcbId
-from msband.static.status import Status, StatusPacket
+import functools
+import collections
+import contextlib
+from msband.sugar import byte_bites
+from msband.static.facility import Facility
+from msband.static.command import Command, CoreModuleGetVersion, GetPcbId, GetProductSerialNumber
+from msband.static.status import Status
+from msband.protocol.core import (
+    Exchange,
+    Transfer,
+    Send,
+    Need,
+    TransferProgress,
+    ProgressCallback,
+    resolve_command,
+    parse_result,
+    BatchItem,
+    prepare_batch,
+    Data,
+    StreamExchange,
+    StatusError,
+)
 from msband.static.constants import BandConstants, ENVOY, pcb_id_to_type
 
 
 if typing.TYPE_CHECKING:
     import socket
     import asyncio
+    import usb.core
     import bleak.backends.client
+    from msband.cache import DeviceCache
 
 
 APP_ID = uuid.UUID(hex="12bb15c4-1c72-4db5-8fef-f53b6818c50b")
 
 
 class ProtocolInterface:
-    __slots__ = "acquire_vars", "band_type"
+    __slots__ = "acquire_vars", "band_type", "cache", "serial"
 
     def __init__(self):
         self.acquire_vars = None
         self.band_type = None
+        self.cache: typing.Optional["DeviceCache"] = None
+        self.serial: typing.Optional[str] = None
 
     @property
     def constants(self) -> BandConstants:
@@ -33,6 +57,7 @@ class ProtocolInterface:
     def acquire(self, **kwargs) -> None:
         self.acquire_vars = kwargs
         self.band_type = None
+        self.serial = None
         try:
             del self.acquire_vars["kwargs"]
         except KeyError:
@@ -46,75 +71,202 @@ class ProtocolInterface:
     def reset(self) -> None:
         return
 
+    @property
+    def identity(self) -> typing.Optional[str]:
+        # Transport address that tells devices apart across reconnects, if there is one
+        return None
+
+    @property
+    def window(self) -> typing.Optional[int]:
+        # None lets the first send() of a transfer decide the window size
+        return None
+
     def send(self, data: bytes, raw: bool) -> int:
         raise NotImplementedError
 
-    def receive(self, length: int) -> bytes:
-        read_data = b""
-
-        while len(read_data) != length:
-            read_data += self.read(length - len(read_data))
+    def transfer(self, data, progress: typing.Optional[ProgressCallback] = None) -> int:
+        transfer = Transfer(data, self.window, progress)
+        while not transfer.complete:
+            transfer.sent(self.send(transfer.next_send().data, raw=True))
+        return transfer.transferred
 
+    def receive(self, length: int) -> bytearray:
+        read_data = bytearray(length)
+        self.receive_into(memoryview(read_data))
         return read_data
 
+    def receive_into(self, buffer: memoryview) -> int:
+        received = 0
+        length = len(buffer)
+
+        while received != length:
+            received += self.read_into(buffer[received:])
+
+        return received
+
     def read(self, length: int) -> bytes:
         raise NotImplementedError
 
+    def read_into(self, buffer: memoryview) -> int:
+        # Fallback for transports that can only hand back new objects
+        read_data = self.read(len(buffer))
+        buffer[: len(read_data)] = read_data
+        return len(read_data)
+
     def communicate(
-        self, data: bytes, response_length: int, transfer: bytes = None
-    ) -> typing.Tuple[bytes, Status]:
+        self,
+        data: bytes,
+        response_length: int,
+        transfer: bytes = None,
+        progress: typing.Optional[ProgressCallback] = None,
+    ) -> typing.Tuple[memoryview, Status]:
+        exchange = Exchange(data, response_length, transfer, self.window, progress)
+
+        while True:
+            event = exchange.next_event()
+            if isinstance(event, Send):
+                exchange.sent(self.send(event.data, raw=event.raw))
+            elif isinstance(event, Need):
+                exchange.received(self.read_into(event.buffer))
+            else:
+                return event.response, event.status
 
-        self.send(data, raw=False)
-        logging.debug(f"Sent bytes: {data}")
+    def command(self, command: typing.Union[Command, str], **kwargs) -> typing.Any:
+        command = resolve_command(command)
 
-        if transfer is not None:
-            transferred = 0
-            transfer_length = len(transfer)
-            packet_size: typing.Optional[int] = None
-            while transferred < transfer_length:
-                if packet_size is None:
-                    packet_size = self.send(b"" + transfer[transferred:], raw=True)
-                    transferred += packet_size
-                    logging.debug(f"Transferred {packet_size}")
-                else:
-                    last_send_size = self.send(
-                        b"" + transfer[transferred : transferred + packet_size], raw=True
-                    )
-                    transferred += last_send_size
-                    logging.debug(f"Transferred {last_send_size}")
+        if self.cache is not None:
+            if command.Immutable and not kwargs:
+                return self.cached_command(command)
+            if command.Facility is Facility.LibrarySRAMFWUpdate:
+                self.forget_cached()
 
-        response_data = self.receive(response_length) if response_length else ""
-        status_data = self.receive(6)
+        # Communication
+        result_bytes, status = self.communicate(
+            *command.build_command_packet(**kwargs), progress=kwargs.get("Progress")
+        )
 
+        return parse_result(command, result_bytes, status, **kwargs)
+
+    def device_serial(self) -> str:
+        if self.serial is not None:
+            return self.serial
+
+        # Asked once per connection: any tool on any host may have updated the firmware since
+        result_bytes, status = self.communicate(*CoreModuleGetVersion.build_command_packet())
+        if status is not Status.Success:
+            raise StatusError(status)
+        version = bytes(result_bytes)
+
+        serial = self.cache.serial_for(self.identity)
+        if serial is None:
+            result_bytes, status = self.communicate(*GetProductSerialNumber.build_command_packet())
+            if status is not Status.Success:
+                raise StatusError(status)
+
+            serial = parse_result(GetProductSerialNumber, result_bytes, status)
+            self.cache.alias(self.identity, serial)
+            self.cache.store(serial, GetProductSerialNumber, bytes(result_bytes))
+
+        # A different version drops every answer cached under the previous one
+        self.cache.store(serial, CoreModuleGetVersion, version)
+        self.serial = serial
+        return serial
+
+    def forget_cached(self) -> None:
+        # New firmware is on its way, drop what the cache holds for this Band
+        # Only from what's known already: the updater app mightn't answer identity queries, and
+        # cache bookkeeping must never get in the way of an update
         try:
-            return response_data, StatusPacket.parse(status_data).Status
-        except construct.ConstError:
-            logging.warning(f"Response: {response_data!r}")
-            logging.warning(f"Status: {status_data!r}")
-            raise
+            serial = self.serial or self.cache.serial_for(self.identity)
+            if serial is not None:
+                self.cache.forget(serial)
+        except Exception as e:
+            logging.warning(f"Could not drop cached answers before the firmware update: {e!r}")
 
-    def command(self, command: typing.Union[Command, str], **kwargs) -> typing.Any:
+    def cached_command(self, command: Command) -> typing.Any:
+        serial = self.device_serial()
 
-        if not isinstance(command, Command):
-            command = Command.get(command)
+        result_bytes = self.cache.lookup(serial, command)
+        if result_bytes is None:
+            result_bytes, status = self.communicate(*command.build_command_packet())
+            if status is not Status.Success:
+                return parse_result(command, result_bytes, status)
 
-        # Communication
-        result_bytes, status = self.communicate(*command.build_command_packet(**kwargs))
+            result_bytes = bytes(result_bytes)
+            self.cache.store(serial, command, result_bytes)
 
-        response_prototype = kwargs.get("Response") or command.Response
+        return parse_result(command, memoryview(result_bytes), Status.Success)
 
-        # Result
-        if response_prototype is None:
-            return result_bytes
+    def batch(
+        self, commands: typing.Iterable[BatchItem]
+    ) -> typing.List[typing.Tuple[typing.Any, Status]]:
+        results = []
 
-        else:
-            if response_prototype is construct.Pass:
-                return status
+        for command, kwargs, packet in prepare_batch(commands):
+            result_bytes, status = self.communicate(*packet, progress=kwargs.get("Progress"))
+            results.append((parse_result(command, result_bytes, status, **kwargs), status))
+
+        return results
 
+    def command_stream(
+        self,
+        command: typing.Union[Command, str],
+        chunk_size: int = 1 << 16,
+        buffers: int = 2,
+        **kwargs,
+    ) -> typing.Iterator[memoryview]:
+        # Each chunk is overwritten buffers - 1 chunks later, copy it if it has to live longer
+        command = resolve_command(command)
+        exchange = StreamExchange(
+            *command.build_command_packet(**kwargs),
+            self.window,
+            kwargs.get("Progress"),
+            chunk_size=chunk_size,
+            buffers=buffers,
+        )
+        return self.drive_stream(exchange)
+
+    def drive_stream(self, exchange: StreamExchange) -> typing.Iterator[memoryview]:
+        while True:
+            event = exchange.next_event()
+            if isinstance(event, Send):
+                exchange.sent(self.send(event.data, raw=event.raw))
+            elif isinstance(event, Need):
+                exchange.received(self.read_into(event.buffer))
+            elif isinstance(event, Data):
+                yield event.chunk
             else:
-                if status.value[1] != 0:
-                    return result_bytes, status
-                return response_prototype.parse(result_bytes)
+                if event.status.value[1] != 0:
+                    raise StatusError(event.status)
+                return
+
+    def command_to_file(
+        self,
+        command: typing.Union[Command, str],
+        path,
+        chunk_size: int = 1 << 16,
+        buffers: int = 4,
+        **kwargs,
+    ) -> int:
+        from concurrent.futures import ThreadPoolExecutor
+
+        # Disk writes run on their own thread while the next chunks are read
+        written = 0
+        writes = collections.deque()
+
+        with open(path, "wb") as file, ThreadPoolExecutor(1) as writer:
+            for chunk in self.command_stream(command, chunk_size, buffers, **kwargs):
+                writes.append(writer.submit(file.write, chunk))
+                written += len(chunk)
+
+                # The oldest chunk's buffer is up next
+                while len(writes) > buffers - 1:
+                    writes.popleft().result()
+
+            for write in writes:
+                write.result()
+
+        return written
 
 
 class MockInterface(ProtocolInterface):
@@ -135,11 +287,203 @@ class MockInterface(ProtocolInterface):
     def read(self, length: int) -> bytes:
         return b"\0" * length
 
+    def read_into(self, buffer: memoryview) -> int:
+        buffer[:] = bytes(len(buffer))
+        return len(buffer)
+
     def communicate(
-        self, data: bytes, response_length: int, transfer: bytes = None
-    ) -> typing.Tuple[bytes, Status]:
+        self,
+        data: bytes,
+        response_length: int,
+        transfer: bytes = None,
+        progress: typing.Optional[ProgressCallback] = None,
+    ) -> typing.Tuple[memoryview, Status]:
         self.send(data)
-        return self.read(response_length), self.status
+        if transfer is not None:
+            self.transfer(transfer, progress=progress)
+        return memoryview(self.receive(response_length)), self.status
+
+
+class AsyncProtocolInterface(ProtocolInterface):
+    __slots__ = ()
+
+    async def reacquire(self) -> None:
+        if self.acquire_vars is None:
+            raise ValueError("Must acquire() at least once before reacquire()")
+        return await self.acquire(**self.acquire_vars)
+
+    async def send(self, data: bytes, raw: bool) -> int:
+        raise NotImplementedError
+
+    async def transfer(self, data, progress: typing.Optional[ProgressCallback] = None) -> int:
+        transfer = Transfer(data, self.window, progress)
+        while not transfer.complete:
+            transfer.sent(await self.send(transfer.next_send().data, raw=True))
+        return transfer.transferred
+
+    async def receive(self, length: int) -> bytearray:
+        read_data = bytearray(length)
+        await self.receive_into(memoryview(read_data))
+        return read_data
+
+    async def receive_into(self, buffer: memoryview) -> int:
+        received = 0
+        length = len(buffer)
+
+        while received != length:
+            received += await self.read_into(buffer[received:])
+
+        return received
+
+    async def read_into(self, buffer: memoryview) -> int:
+        raise NotImplementedError
+
+    async def communicate(
+        self,
+        data: bytes,
+        response_length: int,
+        transfer: bytes = None,
+        progress: typing.Optional[ProgressCallback] = None,
+    ) -> typing.Tuple[memoryview, Status]:
+        exchange = Exchange(data, response_length, transfer, self.window, progress)
+
+        while True:
+            event = exchange.next_event()
+            if isinstance(event, Send):
+                exchange.sent(await self.send(event.data, raw=event.raw))
+            elif isinstance(event, Need):
+                exchange.received(await self.read_into(event.buffer))
+            else:
+                return event.response, event.status
+
+    async def command(self, command: typing.Union[Command, str], **kwargs) -> typing.Any:
+        command = resolve_command(command)
+
+        if self.cache is not None:
+            if command.Immutable and not kwargs:
+                return await self.cached_command(command)
+            if command.Facility is Facility.LibrarySRAMFWUpdate:
+                self.forget_cached()
+
+        # Communication
+        result_bytes, status = await self.communicate(
+            *command.build_command_packet(**kwargs), progress=kwargs.get("Progress")
+        )
+
+        return parse_result(command, result_bytes, status, **kwargs)
+
+    async def device_serial(self) -> str:
+        if self.serial is not None:
+            return self.serial
+
+        result_bytes, status = await self.communicate(*CoreModuleGetVersion.build_command_packet())
+        if status is not Status.Success:
+            raise StatusError(status)
+        version = bytes(result_bytes)
+
+        serial = self.cache.serial_for(self.identity)
+        if serial is None:
+            result_bytes, status = await self.communicate(
+                *GetProductSerialNumber.build_command_packet()
+            )
+            if status is not Status.Success:
+                raise StatusError(status)
+
+            serial = parse_result(GetProductSerialNumber, result_bytes, status)
+            self.cache.alias(self.identity, serial)
+            self.cache.store(serial, GetProductSerialNumber, bytes(result_bytes))
+
+        self.cache.store(serial, CoreModuleGetVersion, version)
+        self.serial = serial
+        return serial
+
+    async def cached_command(self, command: Command) -> typing.Any:
+        serial = await self.device_serial()
+
+        result_bytes = self.cache.lookup(serial, command)
+        if result_bytes is None:
+            result_bytes, status = await self.communicate(*command.build_command_packet())
+            if status is not Status.Success:
+                return parse_result(command, result_bytes, status)
+
+            result_bytes = bytes(result_bytes)
+            self.cache.store(serial, command, result_bytes)
+
+        return parse_result(command, memoryview(result_bytes), Status.Success)
+
+    async def batch(
+        self, commands: typing.Iterable[BatchItem]
+    ) -> typing.List[typing.Tuple[typing.Any, Status]]:
+        results = []
+
+        for command, kwargs, packet in prepare_batch(commands):
+            result_bytes, status = await self.communicate(*packet, progress=kwargs.get("Progress"))
+            results.append((parse_result(command, result_bytes, status, **kwargs), status))
+
+        return results
+
+    def command_stream(
+        self,
+        command: typing.Union[Command, str],
+        chunk_size: int = 1 << 16,
+        buffers: int = 2,
+        **kwargs,
+    ) -> typing.AsyncIterator[memoryview]:
+        # Each chunk is overwritten buffers - 1 chunks later, copy it if it has to live longer
+        command = resolve_command(command)
+        exchange = StreamExchange(
+            *command.build_command_packet(**kwargs),
+            self.window,
+            kwargs.get("Progress"),
+            chunk_size=chunk_size,
+            buffers=buffers,
+        )
+        return self.drive_stream(exchange)
+
+    async def drive_stream(self, exchange: StreamExchange) -> typing.AsyncIterator[memoryview]:
+        while True:
+            event = exchange.next_event()
+            if isinstance(event, Send):
+                exchange.sent(await self.send(event.data, raw=event.raw))
+            elif isinstance(event, Need):
+                exchange.received(await self.read_into(event.buffer))
+            elif isinstance(event, Data):
+                yield event.chunk
+            else:
+                if event.status.value[1] != 0:
+                    raise StatusError(event.status)
+                return
+
+    async def command_to_file(
+        self,
+        command: typing.Union[Command, str],
+        path,
+        chunk_size: int = 1 << 16,
+        buffers: int = 4,
+        **kwargs,
+    ) -> int:
+        import asyncio
+        from concurrent.futures import ThreadPoolExecutor
+
+        # Disk writes run on their own thread while the next chunks are read
+        loop = asyncio.get_running_loop()
+        written = 0
+        writes = collections.deque()
+
+        with open(path, "wb") as file, ThreadPoolExecutor(1) as writer:
+            try:
+                async for chunk in self.command_stream(command, chunk_size, buffers, **kwargs):
+                    writes.append(loop.run_in_executor(writer, file.write, chunk))
+                    written += len(chunk)
+
+                    # The oldest chunk's buffer is up next
+                    while len(writes) > buffers - 1:
+                        await writes.popleft()
+
+            finally:
+                await asyncio.gather(*writes)
+
+        return written
 
 
 BLUETOOTH_PORT = 4
@@ -154,6 +498,10 @@ class BluetoothInterface(ProtocolInterface):
         if id is not None:
             self.acquire(id, port)
 
+    @property
+    def identity(self) -> typing.Optional[str]:
+        return None if self.acquire_vars is None else f"rfcomm:{self.acquire_vars['id']}"
+
     def acquire(self, id: str, port: int = BLUETOOTH_PORT, **kwargs) -> None:
         ProtocolInterface.acquire(**vars())  # ugly
         import socket
@@ -170,34 +518,90 @@ class BluetoothInterface(ProtocolInterface):
     def read(self, length: int) -> bytes:
         return self.socket.recv(length)
 
+    def read_into(self, buffer: memoryview) -> int:
+        return self.socket.recv_into(buffer)
+
+
+class AsyncBluetoothInterface(AsyncProtocolInterface):
+    __slots__ = "socket", "timeout"
+
+    def __init__(self, timeout: float = 5.0):
+        super().__init__()
+        self.socket: typing.Optional["socket.socket"] = None
+        self.timeout = timeout
+
+    @property
+    def identity(self) -> typing.Optional[str]:
+        return None if self.acquire_vars is None else f"rfcomm:{self.acquire_vars['id']}"
+
+    async def acquire(self, id: str, port: int = BLUETOOTH_PORT, **kwargs) -> None:
+        ProtocolInterface.acquire(**vars())  # ugly
+        import socket
+        import asyncio
+
+        self.socket = socket.socket(socket.AF_BLUETOOTH, socket.SOCK_STREAM, socket.BTPROTO_RFCOMM)
+        self.socket.setblocking(False)
+        await asyncio.wait_for(
+            asyncio.get_running_loop().sock_connect(self.socket, (id, port)), self.timeout
+        )
+
+        self.band_type = pcb_id_to_type(await self.command(GetPcbId))
+
+    async def send(self, data: bytes, raw=False) -> int:
+        import asyncio
+
+        if not raw:
+            data = bytes(bytearray([len(data)])) + data
+
+        await asyncio.wait_for(
+            asyncio.get_running_loop().sock_sendall(self.socket, data), self.timeout
+        )
+        return len(data)
+
+    async def read_into(self, buffer: memoryview) -> int:
+        import asyncio
 
-class BLEv2Interface(ProtocolInterface):
+        return await asyncio.wait_for(
+            asyncio.get_running_loop().sock_recv_into(self.socket, buffer), self.timeout
+        )
+
+
+class BLEv2Interface(AsyncProtocolInterface):
     __slots__ = (
         "client",
         "lock_buffer",
         "w_buffer",
         "max_aligned_buffer",
         "max_aligned",
+        "credits",
+        "streaming",
+        "session_depth",
         "send_control_buffer",
-        "recv_buffer",
-        "recv_control_buffer",
+        "reassembler",
         "error_buffer",
-        "status_buffer",
     )
 
-    def __init__(self, id=None):
+    def __init__(self, id=None, streaming: bool = False):
         super().__init__()
         self.client: typing.Optional["bleak.backends.client.BaseBleakClient"] = None
+        self.streaming = streaming  # send commands without per-fragment acknowledgements
+        self.session_depth = 0
         if id is not None:
             self.acquire(id)
 
+    @property
+    def identity(self) -> typing.Optional[str]:
+        return None if self.acquire_vars is None else f"ble:{self.acquire_vars['id']}"
+
     async def acquire(self, id: str, **kwargs) -> None:
         ProtocolInterface.acquire(**vars())  # ugly
         import asyncio
         from bleak import BleakClient
         from msband.protocol.zippy import (
             buffer_notification_closure,
-            buffer_join_fragments_closure,
+            reassembler_control_closure,
+            reassembler_fragment_closure,
+            FragmentReassembler,
             ZIPPY_LOCK,
             ZIPPY_ERROR,
             ZIPPY_MAX_ALIGNED,
@@ -210,8 +614,6 @@ class BLEv2Interface(ProtocolInterface):
             ZIPPY_W2,
         )
 
-        self.status_buffer: asyncio.Queue[bytearray] = asyncio.Queue()
-
         self.client = BleakClient(id)
         await self.client.connect(timeout=5.0)
 
@@ -226,31 +628,25 @@ class BLEv2Interface(ProtocolInterface):
             ZIPPY_MAX_ALIGNED, buffer_notification_closure(self.max_aligned_buffer)
         )
 
-        self.recv_buffer: asyncio.PriorityQueue[
-            typing.Tuple[int, bytearray]
-        ] = asyncio.PriorityQueue()
-        await self.client.start_notify(ZIPPY_R1, buffer_join_fragments_closure(self.recv_buffer))
-        await self.client.start_notify(ZIPPY_R2, buffer_join_fragments_closure(self.recv_buffer))
+        self.reassembler = FragmentReassembler()
+        await self.client.start_notify(ZIPPY_R1, reassembler_fragment_closure(self.reassembler))
+        await self.client.start_notify(ZIPPY_R2, reassembler_fragment_closure(self.reassembler))
 
         self.send_control_buffer: asyncio.Queue[bytearray] = asyncio.Queue()
         await self.client.start_notify(
             ZIPPY_R_CONTROL, buffer_notification_closure(self.send_control_buffer)
         )
 
-        self.recv_control_buffer: asyncio.Queue[bytearray] = asyncio.Queue()
         await self.client.start_notify(
-            ZIPPY_W_CONTROL, buffer_notification_closure(self.recv_control_buffer)
+            ZIPPY_W_CONTROL, reassembler_control_closure(self.reassembler)
         )
 
         self.error_buffer: asyncio.Queue[bytearray] = asyncio.Queue()
         await self.client.start_notify(ZIPPY_ERROR, buffer_notification_closure(self.error_buffer))
 
-        self.band_type = pcb_id_to_type(await self.command(GetPcbId))
+        self.credits: typing.Optional[int] = None
 
-    async def reacquire(self) -> None:
-        if self.acquire_vars is None:
-            raise ValueError("Must acquire() at least once before reacquire()")
-        return await self.acquire(**self.acquire_vars)
+        self.band_type = pcb_id_to_type(await self.command(GetPcbId))
 
     async def reset(self) -> None:
         for attribute in dir(self):
@@ -258,6 +654,7 @@ class BLEv2Interface(ProtocolInterface):
                 buffer: asyncio.Queue[bytearray] = getattr(self, attribute)
                 while not buffer.empty():
                     buffer.get_nowait()
+        self.reassembler.clear()
 
     async def lock(self, lock: bool):
         from msband.protocol.zippy import ZIPPY_LOCK, ZippyLockPacket, ZippyLockPacketStruct
@@ -274,6 +671,111 @@ class BLEv2Interface(ProtocolInterface):
             if not lock and not lock_response.AppID.int:
                 break
 
+    @contextlib.asynccontextmanager
+    async def session(self) -> typing.AsyncIterator["BLEv2Interface"]:
+        # Holds the Zippy lock and the max aligned size across every command inside it
+        if self.session_depth:
+            self.session_depth += 1
+            try:
+                yield self
+            finally:
+                self.session_depth -= 1
+            return
+
+        await self.lock(True)
+        self.session_depth = 1
+        try:
+            await self.refresh_max_aligned()
+            if self.streaming:
+                await self.refresh_buffers()
+            yield self
+        finally:
+            self.session_depth = 0
+            await self.lock(False)
+
+    async def refresh_max_aligned(self) -> None:
+        from msband.protocol.zippy import ZIPPY_MAX_ALIGNED
+
+        while not self.max_aligned_buffer.empty():
+            self.max_aligned_buffer.get_nowait()
+
+        self.max_aligned = construct.Int16ul.parse(
+            await self.client.read_gatt_char(ZIPPY_MAX_ALIGNED)
+        )
+        logging.debug(f"Max aligned: {self.max_aligned}")
+
+    def track_max_aligned(self) -> None:
+        while not self.max_aligned_buffer.empty():
+            self.max_aligned = construct.Int16ul.parse(self.max_aligned_buffer.get_nowait())
+            logging.debug(f"Max aligned changed: {self.max_aligned}")
+
+    @property
+    def window(self) -> typing.Optional[int]:
+        from msband.protocol.zippy import ZIPPY_MAX_FRAGMENTS
+
+        # Fragment ids are a single byte and the control packet length is 16 bits
+        return min(ZIPPY_MAX_FRAGMENTS, 0xFFFF // (self.max_aligned + 1)) * self.max_aligned
+
+    async def refresh_buffers(self) -> None:
+        from msband.protocol.zippy import ZIPPY_R_BUFFER, ZIPPY_W_BUFFER, ZIPPY_MAX_FRAGMENTS
+
+        while not self.w_buffer.empty():
+            self.w_buffer.get_nowait()
+
+        self.credits = construct.Int16ul.parse(await self.client.read_gatt_char(ZIPPY_W_BUFFER))
+        logging.debug(f"Zippy RX credits: {self.credits}")
+
+        # Reassembly takes whole messages, so let the Band send as far ahead as it likes
+        await self.client.write_gatt_char(
+            ZIPPY_R_BUFFER, construct.Int16ul.build(ZIPPY_MAX_FRAGMENTS), response=True
+        )
+
+    def track_credits(self) -> None:
+        while not self.w_buffer.empty():
+            self.credits = construct.Int16ul.parse(self.w_buffer.get_nowait())
+
+    async def stream(self, data) -> int:
+        from msband.protocol.zippy import (
+            ZippyControlPacketStruct,
+            ZippyControlPacket,
+            ZIPPY_R_CONTROL,
+            ZIPPY_W_BUFFER,
+            ZIPPY_W1,
+            ZIPPY_W2,
+        )
+
+        view = memoryview(data).cast("B")
+
+        # ZIPPY_W_BUFFER advertises how many more fragments the Band can take before draining
+        if self.credits is None:
+            self.credits = construct.Int16ul.parse(await self.client.read_gatt_char(ZIPPY_W_BUFFER))
+        self.track_credits()
+        credits = self.credits
+
+        control_length = 0
+        for fragment_id, offset in enumerate(range(0, len(view), self.max_aligned)):
+            fragment = view[offset : offset + self.max_aligned]
+
+            while not credits:
+                credits = self.credits = construct.Int16ul.parse(await self.w_buffer.get())
+
+            await self.client.write_gatt_char(
+                ZIPPY_W2 if fragment_id & 1 else ZIPPY_W1,
+                bytearray((fragment_id, len(fragment))) + fragment,
+                response=False,
+            )
+            credits -= 1
+            control_length += len(fragment) + 1
+
+        write_supplement = ZippyControlPacketStruct.build(ZippyControlPacket(Length=control_length))
+        await self.client.write_gatt_char(ZIPPY_R_CONTROL, write_supplement, response=False)
+
+        response = await self.send_control_buffer.get()
+        if response != bytearray([1]):
+            raise RuntimeError
+
+        return len(view)
+
     async def send(self, data: bytes, raw=False) -> int:
         from msband.protocol.zippy import (
             ZippyControlPacketStruct,
@@ -281,7 +783,8 @@ class BLEv2Interface(ProtocolInterface):
             ZIPPY_R_CONTROL,
         )
 
-        sent_length = 0
+        if raw or self.streaming:
+            return await self.stream(data)
 
         for fragment_id, data_subbytes in enumerate(byte_bites(data, self.max_aligned)):
             await self.write(fragment_id=fragment_id, data=data_subbytes)
@@ -296,7 +799,7 @@ class BLEv2Interface(ProtocolInterface):
             if response != bytearray([1]):
                 raise RuntimeError
 
-        return sent_length
+        return len(data)
 
     async def write(self, fragment_id, data):
         from msband.protocol.zippy import ZIPPY_W1
@@ -307,143 +810,100 @@ class BLEv2Interface(ProtocolInterface):
             ZIPPY_W1, bytearray([fragment_id, len(data)]) + data, response=True
         )
 
-    async def receive(self, length: int) -> bytes:
-        from msband.protocol.zippy import ZippyControlPacketStruct, ZIPPY_W_CONTROL
+    async def receive(self, length: int) -> memoryview:
+        from msband.protocol.zippy import ZIPPY_W_CONTROL
 
-        read_data = bytearray()
+        # One whole Zippy message of at most length bytes, which may carry the status trailer too
+        # Fragments from ZIPPY_R1/ZIPPY_R2 land in place as they arrive, in any order
+        read_data = await (await self.reassembler.messages.get())
 
-        read_supplement = ZippyControlPacketStruct.parse(await self.recv_control_buffer.get())
-        logging.debug(f"{read_supplement=}")
-
-        current_fragment = 0
-        while len(read_data) != length:
-            current_fragment, new_data = await self.read(
-                length - len(read_data), current_fragment=current_fragment
-            )
-            if new_data is not None:
-                read_data.extend(new_data)
-
-        if read_supplement.Length in {
-            len(read_data),
-            len(read_data) + 6,
-        }:
-            await self.client.write_gatt_char(ZIPPY_W_CONTROL, construct.Flag.build(True))
-        else:
+        if len(read_data) > length:
             logging.warning(f"Sending receipt failure, {len(read_data)=}")
             await self.client.write_gatt_char(ZIPPY_W_CONTROL, construct.Flag.build(False))
+            raise ValueError((length, bytes(read_data)))
 
-        return b"" + read_data
-
-    async def read(self, length: int, current_fragment: int = 0) -> typing.Tuple[int, bytes]:
-
-        fragment_id, read_bytes = await self.recv_buffer.get()
-        if fragment_id != current_fragment:
-            logging.debug(f"{current_fragment=} != {fragment_id}")
-            await self.recv_buffer.put((fragment_id, read_bytes))
-            return current_fragment, b""
-
-        excess = len(read_bytes) - length
-
-        if excess == 6:
-            await self.status_buffer.put(read_bytes[length:])
-            return fragment_id, read_bytes[:length]
-        elif not excess:
-            return fragment_id, read_bytes
-        elif excess < 0:
-            return fragment_id + 1, read_bytes
-        else:
-            raise ValueError((length, excess, read_bytes))
+        await self.client.write_gatt_char(ZIPPY_W_CONTROL, construct.Flag.build(True))
+        return read_data
 
     async def communicate(
-        self, data: bytes, response_length: int, transfer: bytes = None
-    ) -> typing.Tuple[bytes, Status]:
-        from msband.protocol.zippy import ZIPPY_MAX_ALIGNED
-
-        if transfer is not None:
-            raise NotImplementedError
-
-        await self.lock(True)
-
-        self.max_aligned = construct.Int16ul.parse(
-            await self.client.read_gatt_char(ZIPPY_MAX_ALIGNED)
-        )
-        logging.debug(f"Max aligned: {self.max_aligned}")
-
-        await self.send(data, raw=False)
-
-        # if transfer is not None:
-        #     transferred = 0
-        #     transfer_length = len(transfer)
-        #     packet_size: typing.Optional[int] = None
-        #     while transferred < transfer_length:
-        #         if packet_size is None:
-        #             packet_size = self.send(b"" + transfer[transferred:], raw=True)
-        #             transferred += packet_size
-        #             logging.debug(f"Transferred {packet_size}")
-        #         else:
-        #             last_send_size = self.send(
-        #                 b"" + transfer[transferred : transferred + packet_size], raw=True
-        #             )
-        #             transferred += last_send_size
-        #             logging.debug(f"Transferred {last_send_size}")
-
-        response_data = await self.receive(response_length) if response_length else ""
-        if self.status_buffer.empty():
-            status_data = await self.receive(6)
-        else:
-            status_data = await self.status_buffer.get()
-
-        try:
-            return response_data, StatusPacket.parse(status_data).Status
-        except construct.ConstError:
-            logging.warning(f"Response: {response_data!r}")
-            logging.warning(f"Status: {status_data!r}")
-            raise
-        finally:
-            await self.lock(False)
-
-    async def command(self, command: typing.Union[Command, str], **kwargs) -> typing.Any:
-
-        if not isinstance(command, Command):
-            command = Command.get(command)
-
-        # Communication
-        result_bytes, status = await self.communicate(*command.build_command_packet(**kwargs))
+        self,
+        data: bytes,
+        response_length: int,
+        transfer: bytes = None,
+        progress: typing.Optional[ProgressCallback] = None,
+    ) -> typing.Tuple[memoryview, Status]:
+
+        async with self.session():
+            self.track_max_aligned()
+            exchange = Exchange(data, response_length, transfer, self.window, progress)
+
+            while True:
+                event = exchange.next_event()
+                if isinstance(event, Send):
+                    exchange.sent(await self.send(event.data, raw=event.raw))
+                elif isinstance(event, Need):
+                    exchange.feed(await self.receive(len(event.buffer)))
+                else:
+                    return event.response, event.status
+
+    async def batch(
+        self, commands: typing.Iterable[BatchItem]
+    ) -> typing.List[typing.Tuple[typing.Any, Status]]:
+        # One lock and one max aligned read for the lot, communicate() nests inside the session
+        async with self.session():
+            return await super().batch(commands)
+
+    async def drive_stream(self, exchange: StreamExchange) -> typing.AsyncIterator[memoryview]:
+        # Zippy hands over whole messages, each one becomes a chunk (or two, with the trailer)
+        async with self.session():
+            self.track_max_aligned()
+
+            while True:
+                event = exchange.next_event()
+                if isinstance(event, Send):
+                    exchange.sent(await self.send(event.data, raw=event.raw))
+                elif isinstance(event, Need):
+                    exchange.feed(await self.receive(exchange.remaining))
+                elif isinstance(event, Data):
+                    yield event.chunk
+                else:
+                    if event.status.value[1] != 0:
+                        raise StatusError(event.status)
+                    return
 
-        response_prototype = kwargs.get("Response") or command.Response
 
-        # Result
-        if response_prototype is None:
-            return result_bytes
+class USBDeviceNotFound(Exception):
+    ...
 
-        else:
-            if response_prototype is construct.Pass:
-                return status
 
-            else:
-                if status.value[1] != 0:
-                    return result_bytes, status
-                return response_prototype.parse(result_bytes)
+def usb_serial_number(band: "usb.core.Device") -> typing.Optional[str]:
+    # A descriptor read, not a Band command, that survives re-enumeration
+    import usb.core
 
-
-class USBDeviceNotFound(Exception):
-    ...
+    try:
+        return band.serial_number
+    except (ValueError, usb.core.USBError):
+        return None
 
 
 class USBInterface(ProtocolInterface):
-    __slots__ = "bulk_in", "bulk_out", "mtu"
+    __slots__ = "bulk_in", "bulk_out", "mtu", "coalesce", "frame", "usb_serial"
 
     def __init__(
         self,
         id: typing.Optional[int] = None,
         vid: int = ENVOY.UsbVendorId,
         pid: int = ENVOY.UsbProductId,
+        coalesce: bool = False,
         **kwargs,
     ):
         super().__init__()
         self.bulk_in = None
         self.bulk_out = None
         self.mtu = None
+        self.coalesce = coalesce  # let libusb split payloads into packets itself
+        self.frame: typing.Optional[array.array] = None
+        self.usb_serial: typing.Optional[str] = None
         if id is not None:
             self.acquire(id=id, vid=vid, pid=pid, **kwargs)
 
@@ -452,6 +912,9 @@ class USBInterface(ProtocolInterface):
         id: typing.Optional[int] = None,
         vid: int = ENVOY.UsbVendorId,
         pid: int = ENVOY.UsbProductId,
+        bus: typing.Optional[int] = None,
+        address: typing.Optional[int] = None,
+        serial: typing.Optional[str] = None,
         **kwargs,
     ):
         ProtocolInterface.acquire(**vars())  # ugly
@@ -461,12 +924,34 @@ class USBInterface(ProtocolInterface):
         filter_kwargs = dict(idVendor=vid, idProduct=pid)
         if id:
             filter_kwargs["iSerialNumber"] = id
+        if bus is not None:
+            filter_kwargs["bus"] = bus
+        if address is not None:
+            filter_kwargs["address"] = address
+        if serial is not None:
+            # Unlike the bus address, the serial number survives re-enumeration
+            filter_kwargs["custom_match"] = lambda device: usb_serial_number(device) == serial
 
         band: usb.core.Device = usb.core.find(**filter_kwargs)
 
         if band is None:
             raise USBDeviceNotFound(f"No Band device found with variables {self.acquire_vars}")
 
+        self.claim(band)
+
+    def attach(self, band: "usb.core.Device") -> None:
+        # For devices that were already found, e.g. by a find_all scan
+        # reacquire() looks for the serial number, the address changes on every re-enumeration
+        serial = usb_serial_number(band)
+        if serial is None:
+            location = dict(bus=band.bus, address=band.address)
+        else:
+            location = dict(serial=serial)
+
+        ProtocolInterface.acquire(self, id=None, vid=band.idVendor, pid=band.idProduct, **location)
+        self.claim(band)
+
+    def claim(self, band: "usb.core.Device") -> None:
         (configuration,) = band
         configuration.set()
 
@@ -474,18 +959,150 @@ class USBInterface(ProtocolInterface):
 
         self.bulk_in, self.bulk_out = interface
         self.mtu = self.bulk_out.wMaxPacketSize
+        self.frame = array.array("B", bytes(self.mtu))
+
+        self.usb_serial = usb_serial_number(band)
+
+    @property
+    def identity(self) -> typing.Optional[str]:
+        return None if self.usb_serial is None else f"usb:{self.usb_serial}"
 
     def reset(self):
         self.bulk_in.clear_halt()
         self.bulk_out.clear_halt()
 
+    @property
+    def window(self) -> typing.Optional[int]:
+        if self.coalesce:
+            return None
+        return self.mtu
+
     def send(self, data: bytes, raw: bool = True) -> int:
-        written = 0
+        # PyUSB converts anything that isn't an array("B") byte by byte, so always hand it one
+        view = memoryview(data).cast("B")
 
-        for data_slice in bites(data, self.mtu):
-            written += self.bulk_out.write(b"" + bytearray(data_slice))
+        if self.coalesce:
+            frame = array.array("B")
+            frame.frombytes(view)
+            return self.bulk_out.write(frame)
+
+        written = 0
+        for offset in range(0, len(view), self.mtu):
+            written += self.bulk_out.write(self.framed(view[offset : offset + self.mtu]))
 
         return written
 
+    def framed(self, data_slice: memoryview) -> array.array:
+        if len(data_slice) != self.mtu:
+            frame = array.array("B")
+            frame.frombytes(data_slice)
+            return frame
+
+        memoryview(self.frame)[:] = data_slice
+        return self.frame
+
     def read(self, length: int) -> bytes:
         return self.bulk_in.read(length)
+
+
+class AsyncUSBInterface(AsyncProtocolInterface):
+    __slots__ = "device", "executor"
+
+    def __init__(self, coalesce: bool = False):
+        super().__init__()
+        import concurrent.futures
+
+        # libusb calls block, so every device gets its own I/O thread to keep commands in order
+        self.device = USBInterface(coalesce=coalesce)
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="msband-usb"
+        )
+
+    async def run(self, function: typing.Callable, *args) -> typing.Any:
+        import asyncio
+
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    async def acquire(
+        self,
+        id: typing.Optional[int] = None,
+        vid: int = ENVOY.UsbVendorId,
+        pid: int = ENVOY.UsbProductId,
+        bus: typing.Optional[int] = None,
+        address: typing.Optional[int] = None,
+        serial: typing.Optional[str] = None,
+        **kwargs,
+    ) -> None:
+        ProtocolInterface.acquire(**vars())  # ugly
+
+        await self.run(
+            functools.partial(
+                self.device.acquire,
+                id=id,
+                vid=vid,
+                pid=pid,
+                bus=bus,
+                address=address,
+                serial=serial,
+                **kwargs,
+            )
+        )
+
+        self.band_type = pcb_id_to_type(await self.command(GetPcbId))
+
+    async def attach(self, band: "usb.core.Device") -> None:
+        await self.run(self.device.attach, band)
+        ProtocolInterface.acquire(self, **self.device.acquire_vars)
+
+        self.band_type = pcb_id_to_type(await self.command(GetPcbId))
+
+    async def reset(self) -> None:
+        return await self.run(self.device.reset)
+
+    @property
+    def identity(self) -> typing.Optional[str]:
+        return self.device.identity
+
+    @property
+    def window(self) -> typing.Optional[int]:
+        return self.device.window
+
+    async def send(self, data: bytes, raw: bool = True) -> int:
+        return await self.run(self.device.send, data, raw)
+
+    async def read_into(self, buffer: memoryview) -> int:
+        return await self.run(self.device.read_into, buffer)
+
+    async def communicate(
+        self,
+        data: bytes,
+        response_length: int,
+        transfer: bytes = None,
+        progress: typing.Optional[ProgressCallback] = None,
+    ) -> typing.Tuple[memoryview, Status]:
+        import asyncio
+
+        # One hop to the I/O thread per command rather than one per bulk read/write
+        if progress is not None:
+            loop = asyncio.get_running_loop()
+            progress = functools.partial(loop.call_soon_threadsafe, progress)
+
+        return await self.run(self.device.communicate, data, response_length, transfer, progress)
+
+    async def batch(
+        self, commands: typing.Iterable[BatchItem]
+    ) -> typing.List[typing.Tuple[typing.Any, Status]]:
+        import asyncio
+
+        # The whole batch runs on the I/O thread in one hop
+        loop = asyncio.get_running_loop()
+        threaded = []
+
+        for command, kwargs in commands:
+            progress = kwargs.get("Progress")
+            if progress is not None:
+                progress = functools.partial(loop.call_soon_threadsafe, progress)
+                kwargs = dict(kwargs, Progress=progress)
+            threaded.append((command, kwargs))
+
+        return await self.run(self.device.batch, threaded)
@@ -0,0 +1,314 @@
+import time
+import struct
+import typing
+import logging
+import construct
+import dataclasses
+from msband.static.command import Command, response_decoder
+from msband.static.status import Status, parse_status
+
+
+STATUS_LENGTH = 6
+
+
+@dataclasses.dataclass(frozen=True)
+class TransferProgress:
+    transferred: int
+    total: int
+    elapsed: float
+
+    @property
+    def throughput(self) -> float:  # bytes per second
+        if not self.elapsed:
+            return 0.0
+        return self.transferred / self.elapsed
+
+
+ProgressCallback = typing.Callable[[TransferProgress], None]
+
+
+# Events, what the transport should do next
+
+
+@dataclasses.dataclass(frozen=True)
+class Send:
+    data: typing.Union[bytes, bytearray, memoryview]
+    raw: bool
+
+
+@dataclasses.dataclass(frozen=True)
+class Need:
+    buffer: memoryview  # the next len(buffer) bytes go here
+
+
+@dataclasses.dataclass(frozen=True)
+class Data:
+    chunk: memoryview  # response bytes for the caller, only valid for a few more events
+
+
+@dataclasses.dataclass(frozen=True)
+class Done:
+    response: memoryview
+    status: Status
+
+
+class StatusError(Exception):
+    ...
+
+
+class Transfer:
+    __slots__ = "view", "window", "transferred", "started", "progress"
+
+    def __init__(
+        self,
+        data,
+        window: typing.Optional[int] = None,
+        progress: typing.Optional[ProgressCallback] = None,
+    ):
+        self.view = memoryview(data).cast("B")
+        self.window = window  # None lets the first send decide the window size
+        self.transferred = 0
+        self.started = time.perf_counter()
+        self.progress = progress
+
+    @property
+    def complete(self) -> bool:
+        return self.transferred >= len(self.view)
+
+    def next_send(self) -> Send:
+        if self.window is None:
+            return Send(self.view[self.transferred :], raw=True)
+        return Send(self.view[self.transferred : self.transferred + self.window], raw=True)
+
+    def sent(self, count: int) -> None:
+        if not count:
+            raise ConnectionError(f"Transfer stalled at {self.transferred}/{len(self.view)} bytes")
+
+        if self.window is None:
+            self.window = count
+        self.transferred += count
+        logging.debug(f"Transferred {count}")
+
+        if self.progress is not None:
+            self.progress(
+                TransferProgress(
+                    self.transferred, len(self.view), time.perf_counter() - self.started
+                )
+            )
+
+
+class Exchange:
+    __slots__ = "data", "transfer", "response_length", "buffer", "filled", "command_sent"
+
+    def __init__(
+        self,
+        data: bytes,
+        response_length: int,
+        transfer=None,
+        window: typing.Optional[int] = None,
+        progress: typing.Optional[ProgressCallback] = None,
+    ):
+        self.data = data
+        self.transfer = None if transfer is None else Transfer(transfer, window, progress)
+        self.response_length = response_length
+
+        # The response and its status trailer share one allocation
+        self.buffer = memoryview(bytearray(response_length + STATUS_LENGTH))
+        self.filled = 0
+        self.command_sent = False
+
+    def next_event(self) -> typing.Union[Send, Need, Done]:
+        if not self.command_sent:
+            return Send(self.data, raw=False)
+
+        if self.transfer is not None and not self.transfer.complete:
+            return self.transfer.next_send()
+
+        if self.filled < len(self.buffer):
+            return Need(self.buffer[self.filled :])
+
+        return Done(*self.result())
+
+    def sent(self, count: int) -> None:
+        if not self.command_sent:
+            self.command_sent = True
+            logging.debug(f"Sent bytes: {self.data}")
+            return
+
+        self.transfer.sent(count)
+
+    def received(self, count: int) -> None:
+        # For transports that filled the Need buffer in place
+        self.filled += count
+
+    def feed(self, data) -> None:
+        # For transports that hand over whole messages
+        end = self.filled + len(data)
+        if end > len(self.buffer):
+            raise ValueError(f"Got {end} bytes, expected {len(self.buffer)}")
+
+        self.buffer[self.filled : end] = data
+        self.filled = end
+
+    def result(self) -> typing.Tuple[memoryview, Status]:
+        response_data = self.buffer[: self.response_length]
+        status_data = self.buffer[self.response_length :]
+
+        try:
+            return response_data, parse_status(status_data)
+        except construct.ConstError:
+            logging.warning(f"Response: {bytes(response_data)!r}")
+            logging.warning(f"Status: {bytes(status_data)!r}")
+            raise
+
+
+class StreamExchange:
+    # Like Exchange, but hands the response out in chunks instead of collecting it
+    # Chunks cycle through a few fixed buffers, so memory stays flat whatever the response length
+    __slots__ = (
+        "data",
+        "transfer",
+        "command_sent",
+        "response_length",
+        "delivered",
+        "buffers",
+        "turn",
+        "ready",
+        "pending",
+        "trailer",
+        "trailer_filled",
+    )
+
+    def __init__(
+        self,
+        data: bytes,
+        response_length: int,
+        transfer=None,
+        window: typing.Optional[int] = None,
+        progress: typing.Optional[ProgressCallback] = None,
+        chunk_size: int = 1 << 16,
+        buffers: int = 2,
+    ):
+        self.data = data
+        self.transfer = None if transfer is None else Transfer(transfer, window, progress)
+        self.command_sent = False
+
+        self.response_length = response_length
+        self.delivered = 0
+
+        # A chunk stays intact until buffers - 1 more chunks have been handed out
+        chunk_size = min(chunk_size, response_length) or 1
+        self.buffers = [memoryview(bytearray(chunk_size)) for _ in range(buffers)]
+        self.turn = 0
+        self.ready: typing.Optional[memoryview] = None
+        self.pending: typing.Optional[memoryview] = None
+
+        self.trailer = memoryview(bytearray(STATUS_LENGTH))
+        self.trailer_filled = 0
+
+    @property
+    def remaining(self) -> int:
+        return self.response_length - self.delivered + STATUS_LENGTH - self.trailer_filled
+
+    def next_event(self) -> typing.Union[Send, Need, Data, Done]:
+        if not self.command_sent:
+            return Send(self.data, raw=False)
+
+        if self.transfer is not None and not self.transfer.complete:
+            return self.transfer.next_send()
+
+        if self.ready is not None:
+            chunk, self.ready = self.ready, None
+            return Data(chunk)
+
+        if self.pending is not None:
+            return self.split_pending()
+
+        if self.delivered < self.response_length:
+            buffer = self.buffers[self.turn]
+            return Need(buffer[: self.response_length - self.delivered])
+
+        if self.trailer_filled < STATUS_LENGTH:
+            return Need(self.trailer[self.trailer_filled :])
+
+        status = parse_status(self.trailer)
+        return Done(memoryview(b""), status)
+
+    def sent(self, count: int) -> None:
+        if not self.command_sent:
+            self.command_sent = True
+            logging.debug(f"Sent bytes: {self.data}")
+            return
+
+        self.transfer.sent(count)
+
+    def received(self, count: int) -> None:
+        # For transports that filled the Need buffer in place
+        if self.delivered < self.response_length:
+            self.ready = self.buffers[self.turn][:count]
+            self.turn = (self.turn + 1) % len(self.buffers)
+            self.delivered += count
+        else:
+            self.trailer_filled += count
+
+    def feed(self, data) -> None:
+        # For transports that hand over whole messages, chunks are then views into them
+        if len(data) > self.remaining:
+            raise ValueError(f"Got {len(data)} bytes, expected at most {self.remaining}")
+        self.pending = memoryview(data)
+
+    def split_pending(self) -> typing.Union[Data, Need, Done]:
+        take = min(len(self.pending), self.response_length - self.delivered)
+        if take:
+            chunk, self.pending = self.pending[:take], self.pending[take:]
+            self.delivered += take
+            return Data(chunk)
+
+        end = self.trailer_filled + len(self.pending)
+        self.trailer[self.trailer_filled : end] = self.pending
+        self.trailer_filled = end
+        self.pending = None
+        return self.next_event()
+
+
+def resolve_command(command: typing.Union[Command, str]) -> Command:
+    if not isinstance(command, Command):
+        command = Command.get(command)
+    return command
+
+
+BatchItem = typing.Tuple[typing.Union[Command, str], typing.Dict[str, typing.Any]]
+
+
+def prepare_batch(
+    commands: typing.Iterable[BatchItem],
+) -> typing.List[typing.Tuple[Command, typing.Dict[str, typing.Any], tuple]]:
+    # Every packet is built before the first one goes out, so a bad argument fails the whole batch
+    prepared = []
+    for command, kwargs in commands:
+        command = resolve_command(command)
+        prepared.append((command, kwargs, command.build_command_packet(**kwargs)))
+    return prepared
+
+
+def parse_result(
+    command: Command, result_bytes: memoryview, status: Status, **kwargs
+) -> typing.Any:
+    response_prototype = kwargs.get("Response") or command.Response
+
+    # Result
+    if response_prototype is None:
+        return bytes(result_bytes)
+
+    else:
+        if response_prototype is construct.Pass:
+            return status
+
+        else:
+            if status.value[1] != 0:
+                return bytes(result_bytes), status
+
+            try:
+                return response_decoder(response_prototype)(result_bytes)
+            except struct.error:
+                return response_prototype.parse(result_bytes)  # let construct explain
@@ -1,4 +1,5 @@
 import uuid
+import typing
 import asyncio
 import logging
 import dataclasses
@@ -28,6 +29,8 @@ ZIPPY_ERROR = uuid.UUID(hex="d2a1e333-c56c-445c-a24d-4a4440c676f6")  # read, not
 # LOCK
 ZIPPY_LOCK = uuid.UUID(hex="2f8784ec-6a34-11b6-634d-b7369dce1c55")  # write, read, notify
 
+ZIPPY_MAX_FRAGMENTS = 0x100  # per message, fragment ids are a single byte
+
 
 # PUSH
 PUSH2_SERVICE = uuid.UUID(hex="0BAD7FCC-2EE4-F1AC-439F-D7B2BA250294")
@@ -68,13 +71,81 @@ def buffer_notification_closure(buffer: asyncio.Queue):
     return buffer_notification
 
 
-def buffer_join_fragments_closure(buffer: asyncio.Queue):
-    async def buffer_notification(sender: int, data: bytearray) -> None:
+class FragmentReassembler:
+    __slots__ = "buffer", "offset", "fragment", "pending", "done", "messages"
+
+    def __init__(self):
+        self.buffer: typing.Optional[bytearray] = None
+        self.offset = 0
+        self.fragment = 0
+        self.pending: typing.Dict[int, memoryview] = {}
+        self.done: typing.Optional[asyncio.Future] = None
+        self.messages: asyncio.Queue[asyncio.Future] = asyncio.Queue()
+
+    def clear(self) -> None:
+        self.buffer = None
+        self.pending.clear()
+        while not self.messages.empty():
+            self.messages.get_nowait()
+
+    def expect(self, length: int) -> None:
+        self.buffer = bytearray(length)
+        self.offset = 0
+        self.fragment = 0
+        self.done = asyncio.get_running_loop().create_future()
+        self.messages.put_nowait(self.done)
+
+        if not length:
+            self.done.set_result(memoryview(self.buffer))
+            self.buffer = None
+
+        self.drain()
+
+    def feed(self, fragment_id: int, data: memoryview) -> None:
+        if self.buffer is None or fragment_id != self.fragment & 0xFF:
+            self.pending[fragment_id] = data
+            return
+
+        self.place(data)
+        self.drain()
+
+    def drain(self) -> None:
+        while self.buffer is not None and self.pending:
+            data = self.pending.pop(self.fragment & 0xFF, None)
+            if data is None:
+                break
+            self.place(data)
+
+    def place(self, data: memoryview) -> None:
+        end = self.offset + len(data)
+        if end > len(self.buffer):
+            self.buffer = None
+            self.done.set_exception(ValueError(f"Fragment {self.fragment} overruns the message"))
+            return
+
+        self.buffer[self.offset : end] = data
+        self.offset = end
+        self.fragment += 1
+
+        if end == len(self.buffer):
+            self.done.set_result(memoryview(self.buffer))
+            self.buffer = None
+
+
+def reassembler_control_closure(reassembler: FragmentReassembler):
+    async def reassembler_control(sender: int, data: bytearray) -> None:
         logging.info(f"From handle {sender} got {data}")
-        fragment_id, fragment_data = data[0], data[1:]
-        await buffer.put((fragment_id, fragment_data))
+        reassembler.expect(ZippyControlPacketStruct.parse(data).Length)
 
-    return buffer_notification
+    return reassembler_control
+
+
+def reassembler_fragment_closure(reassembler: FragmentReassembler):
+    async def reassembler_fragment(sender: int, data: bytearray) -> None:
+        logging.info(f"From handle {sender} got {data}")
+        reassembler.feed(data[0], memoryview(data)[1:])
+
+    return reassembler_fragment
 
 
 class ZippyLock(EnumBase):
@@ -0,0 +1,214 @@
+import sys
+import time
+import errno
+import random
+import typing
+import asyncio
+import logging
+import pathlib
+import dataclasses
+from msband.static.command import Command, EFlashRead
+from msband.protocol import ProtocolInterface, AsyncProtocolInterface, USBDeviceNotFound
+
+
+T = typing.TypeVar("T")
+S = typing.TypeVar("S")
+
+# Permissions won't fix themselves by reconnecting
+FATAL_ERRNOS = {errno.EACCES, errno.EPERM}
+
+# Socket errors that aren't ConnectionErrors, e.g. a Band out of Bluetooth range
+# Other OSErrors, like ENOSPC or EIO from a disk, aren't the transport's
+TRANSPORT_ERRNOS = {
+    errno.EHOSTDOWN,
+    errno.EHOSTUNREACH,
+    errno.ENETDOWN,
+    errno.ENETUNREACH,
+    errno.ENOTCONN,
+    errno.ETIMEDOUT,
+}
+
+
+def is_retryable(error: BaseException) -> bool:
+    # Unplugged, out of range or just slow: the transport broke, not the command
+    if isinstance(error, USBDeviceNotFound):
+        return True  # not re-enumerated yet
+
+    usb_core = sys.modules.get("usb.core")
+    if usb_core is not None and isinstance(error, usb_core.USBError):
+        return error.errno not in FATAL_ERRNOS
+
+    if isinstance(error, (ConnectionError, TimeoutError, asyncio.TimeoutError, EOFError)):
+        return True
+
+    if isinstance(error, OSError):
+        return error.errno in TRANSPORT_ERRNOS
+
+    bleak_exc = sys.modules.get("bleak.exc")
+    if bleak_exc is not None and isinstance(error, bleak_exc.BleakError):
+        return True
+
+    return False
+
+
+@dataclasses.dataclass(frozen=True)
+class Backoff:
+    attempts: int = 5
+    initial: float = 0.5  # seconds
+    factor: float = 2.0
+    maximum: float = 30.0
+    jitter: float = 0.1  # fraction of each delay
+
+    def delay(self, attempt: int) -> float:
+        delay = min(self.initial * self.factor**attempt, self.maximum)
+        return delay * (1 + random.uniform(-self.jitter, self.jitter))
+
+
+class ResilientInterface:
+    # Wraps a ProtocolInterface, reconnecting through reacquire() when the transport fails
+    # Long operations are written as steps so a reconnect resumes from the last finished one
+    __slots__ = "iband", "backoff", "retryable", "reconnects"
+
+    def __init__(
+        self,
+        iband: ProtocolInterface,
+        backoff: Backoff = Backoff(),
+        retryable: typing.Callable[[BaseException], bool] = is_retryable,
+    ):
+        self.iband = iband
+        self.backoff = backoff
+        self.retryable = retryable
+        self.reconnects = 0
+
+    def reconnect(self, attempt: int) -> int:
+        # Returns the attempt count after reconnecting, acquire() failures use up attempts too
+        while True:
+            if attempt >= self.backoff.attempts:
+                raise ConnectionError(f"Gave up reconnecting after {attempt} attempts")
+
+            time.sleep(self.backoff.delay(attempt))
+            attempt += 1
+
+            try:
+                self.iband.reacquire()
+            except Exception as e:
+                if not self.retryable(e):
+                    raise
+                logging.warning(f"Reconnect attempt {attempt} failed: {e!r}")
+                continue
+
+            self.reconnects += 1
+            return attempt
+
+    def call(self, operation: typing.Callable[[ProtocolInterface], T]) -> T:
+        attempt = 0
+
+        while True:
+            try:
+                return operation(self.iband)
+            except Exception as e:
+                if not self.retryable(e) or attempt >= self.backoff.attempts:
+                    raise
+                logging.warning(f"Transport failed, reconnecting: {e!r}")
+                attempt = self.reconnect(attempt)
+
+    def command(self, command: typing.Union[Command, str], **kwargs) -> typing.Any:
+        return self.call(lambda iband: iband.command(command, **kwargs))
+
+    def resume(
+        self, step: typing.Callable[[ProtocolInterface, S], typing.Optional[S]], state: S
+    ) -> S:
+        # step returns the next state once its work is safely done, or None when there's no more
+        # A failure repeats the step from the last state it returned, not from the beginning
+        while True:
+            next_state = self.call(lambda iband: step(iband, state))
+            if next_state is None:
+                return state
+            state = next_state
+
+    def read_flash(
+        self, path: typing.Union[str, pathlib.Path], address: int, length: int, piece: int = 1 << 16
+    ) -> int:
+        # EFlashRead takes an address, so a broken read picks up at the last piece on disk
+        # Only the reads are retried, a failing disk is raised as it is
+        path = pathlib.Path(path)
+        offset = min(path.stat().st_size if path.exists() else 0, length)
+
+        with path.open("r+b" if path.exists() else "wb") as file:
+            file.truncate(offset)
+            file.seek(offset)
+
+            while offset < length:
+                data_length = min(piece, length - offset)
+                data = self.call(
+                    lambda iband: iband.command(
+                        EFlashRead, Address=address + offset, DataLength=data_length
+                    )
+                )
+                file.write(data)
+                file.flush()
+                offset += len(data)
+
+        return offset
+
+
+class AsyncResilientInterface:
+    __slots__ = "iband", "backoff", "retryable", "reconnects"
+
+    def __init__(
+        self,
+        iband: AsyncProtocolInterface,
+        backoff: Backoff = Backoff(),
+        retryable: typing.Callable[[BaseException], bool] = is_retryable,
+    ):
+        self.iband = iband
+        self.backoff = backoff
+        self.retryable = retryable
+        self.reconnects = 0
+
+    async def reconnect(self, attempt: int) -> int:
+        while True:
+            if attempt >= self.backoff.attempts:
+                raise ConnectionError(f"Gave up reconnecting after {attempt} attempts")
+
+            await asyncio.sleep(self.backoff.delay(attempt))
+            attempt += 1
+
+            try:
+                await self.iband.reacquire()
+            except Exception as e:
+                if not self.retryable(e):
+                    raise
+                logging.warning(f"Reconnect attempt {attempt} failed: {e!r}")
+                continue
+
+            self.reconnects += 1
+            return attempt
+
+    async def call(
+        self, operation: typing.Callable[[AsyncProtocolInterface], typing.Awaitable[T]]
+    ) -> T:
+        attempt = 0
+
+        while True:
+            try:
+                return await operation(self.iband)
+            except Exception as e:
+                if not self.retryable(e) or attempt >= self.backoff.attempts:
+                    raise
+                logging.warning(f"Transport failed, reconnecting: {e!r}")
+                attempt = await self.reconnect(attempt)
+
+    async def command(self, command: typing.Union[Command, str], **kwargs) -> typing.Any:
+        return await self.call(lambda iband: iband.command(command, **kwargs))
+
+    async def resume(
+        self,
+        step: typing.Callable[[AsyncProtocolInterface, S], typing.Awaitable[typing.Optional[S]]],
+        state: S,
+    ) -> S:
+        while True:
+            next_state = await self.call(lambda iband: step(iband, state))
+            if next_state is None:
+                return state
+            state = next_state
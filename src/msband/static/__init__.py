@@ -5,7 +5,6 @@ import reprlib
 import construct
 import itertools
 import dataclasses
-from PIL import Image
 import datetime as dt
 from msband.sugar import IntEnumAdapter, EnumBase, csfield
 from construct_typed import DataclassMixin, DataclassStruct, TEnum
@@ -38,6 +37,9 @@ from construct import (
     FlagsEnum,
 )
 
+if typing.TYPE_CHECKING:
+    from PIL import Image  # only needed by MeTileAdapter, imported there when used
+
 
 # Needed for a weird recursion error
 dataclasses.Field.__repr__ = reprlib.recursive_repr()(dataclasses.Field.__repr__)
@@ -97,7 +99,7 @@ class MeTileAdapter(Adapter):
         self.width = width
         self.height = height
 
-    def _encode(self, image: Image, context, path):
+    def _encode(self, image: "Image.Image", context, path):
         # No packer found from RGB to BGR;16
         # return image.tobytes("raw", "BGR;16")
 
@@ -117,7 +119,9 @@ class MeTileAdapter(Adapter):
 
         return b"" + bgr
 
-    def _decode(self, image: bytes, context, path):
+    def _decode(self, image: bytes, context, path) -> "Image.Image":
+        from PIL import Image
+
         return Image.frombytes("RGB", (self.width, self.height), image, "raw", "BGR;16")
 
 
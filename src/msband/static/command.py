@@ -1,5 +1,7 @@
+import struct
 import typing
 import construct
+import functools
 import dataclasses
 from msband.static.oobe import OobeStageAdapter
 from msband.static.timezone import TimeZoneStruct
@@ -45,6 +47,260 @@ from construct import (
 COMMAND_PACKET = 12025  # F9 2E
 
 
+def _is_raw_transfer(transfer: typing.Dict[str, construct.Construct]) -> bool:
+    return len(transfer) == 1 and next(iter(transfer.values())) is GreedyBytes
+
+
+def _compile_fields(
+    fields: typing.Dict[str, construct.Construct], prefix: str = "<"
+) -> typing.Optional[typing.Tuple[struct.Struct, typing.Tuple[typing.Tuple[str, bytes], ...]]]:
+    # One struct.Struct for a run of plain integer fields and constants, None if anything else
+    fmt = prefix
+    layout = []
+
+    for name, subcon in fields.items():
+        if isinstance(subcon, Const):
+            try:
+                constant = subcon.build(None)
+            except construct.ConstructError:
+                return None
+            fmt += f"{len(constant)}s"
+            layout.append((None, constant))
+
+        elif isinstance(subcon, construct.FormatField) and subcon.fmtstr[0] == "<":
+            fmt += subcon.fmtstr[1:]
+            layout.append((name, None))
+
+        else:
+            return None
+
+    return struct.Struct(fmt), tuple(layout)
+
+
+@functools.lru_cache(maxsize=None)
+def _response_length(response: construct.Construct) -> typing.Optional[int]:
+    try:
+        return response.sizeof()
+    except construct.SizeofError:
+        return None  # variable, DataLength decides
+
+
+def _compile_scalar(subcon: construct.Construct):
+    # (struct format, decode or None) for a fixed-size scalar, None if it needs construct
+    if isinstance(subcon, construct.FormatField):
+        if subcon.fmtstr[0] == "<" and len(subcon.fmtstr) == 2:
+            return subcon.fmtstr[1], None
+
+    elif isinstance(subcon, construct.Adapter):
+        inner = _compile_scalar(subcon.subcon)
+        if inner is not None and inner[1] is None:
+            return inner[0], subcon._decode
+
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def response_decoder(response: construct.Construct) -> typing.Callable[[typing.Any], typing.Any]:
+    # Fixed-layout responses (integers, adapters over them and flat Structs of those) unpack
+    # with one struct.Struct, everything else is left to construct
+    context = construct.Container()
+    path = "(parsing)"
+
+    scalar = _compile_scalar(response)
+    if scalar is not None:
+        fmt, decode = scalar
+        unpack_from = struct.Struct("<" + fmt).unpack_from
+
+        if decode is None:
+            return lambda data: unpack_from(data)[0]
+        return lambda data: decode(unpack_from(data)[0], context, path)
+
+    if isinstance(response, construct.Struct) and response.subcons:
+        names = []
+        fields = []
+        for subcon in response.subcons:
+            field = _compile_scalar(getattr(subcon, "subcon", None))
+            if not isinstance(subcon, construct.Renamed) or not subcon.name or field is None:
+                return response.parse
+            names.append(subcon.name)
+            fields.append(field)
+
+        unpack_from = struct.Struct("<" + "".join(fmt for fmt, _ in fields)).unpack_from
+        decoders = [decode for _, decode in fields]
+
+        def decode_struct(data):
+            return construct.Container(
+                (name, value if decode is None else decode(value, context, path))
+                for name, decode, value in zip(names, decoders, unpack_from(data))
+            )
+
+        return decode_struct
+
+    return response.parse
+
+
+def _pack_values(layout, kwargs: dict, command: "Command") -> typing.List:
+    values = []
+    for name, constant in layout:
+        if name is None:
+            values.append(constant)
+        elif name in kwargs:
+            values.append(kwargs[name])
+        else:
+            raise TypeError(f"{name} must be provided as an argument for {command}")
+    return values
+
+
+class CommandEncoder:
+    # build_command_packet for a single Command, with everything that doesn't depend on the call
+    # worked out once: the header bytes, the argument/transfer layouts and the response size
+    __slots__ = "command", "header", "arguments", "transfer", "raw", "response_length", "compiled"
+
+    def __init__(self, command: "Command"):
+        self.command = command
+        self.header = Int16ul.build(COMMAND_PACKET) + _command_bytes(command)
+
+        # DataLength leads the arguments, so it joins their struct
+        self.arguments = _compile_fields(command.Arguments or {}, prefix="<I")
+
+        self.raw = command.Transfer is not None and _is_raw_transfer(command.Transfer)
+        self.transfer = None
+        if command.Transfer is not None and not self.raw:
+            self.transfer = _compile_fields(command.Transfer)
+
+        self.response_length = None
+        if command.Response is not None:
+            self.response_length = _response_length(command.Response)
+
+        # Anything else takes the generic path
+        self.compiled = (
+            self.arguments is not None
+            and (command.Transfer is None or self.raw or self.transfer is not None)
+            and (command.Transferless or command.Transfer is not None)
+        )
+
+    def __call__(self, kwargs: dict):
+        command = self.command
+        DataLength = kwargs.get("DataLength") or command.DataLength
+
+        transfer_bytes = None
+        if self.raw:
+            (argument_name,) = command.Transfer
+            if argument_name not in kwargs:
+                raise TypeError(f"{argument_name} must be provided as an argument for {command}")
+
+            transfer_bytes = memoryview(kwargs[argument_name]).cast("B")
+            DataLength = DataLength or len(transfer_bytes)
+
+        elif self.transfer is not None:
+            transfer_struct, layout = self.transfer
+            transfer_bytes = transfer_struct.pack(*_pack_values(layout, kwargs, command))
+            DataLength = DataLength or len(transfer_bytes)
+
+        if DataLength is None:
+            raise TypeError(f"DataLength must be provided as an argument for {command}")
+
+        arguments_struct, layout = self.arguments
+        packet = self.header + arguments_struct.pack(
+            DataLength, *_pack_values(layout, kwargs, command)
+        )
+
+        response_length = self.response_length
+        if kwargs.get("Response") is not None:
+            response_length = _response_length(kwargs["Response"])
+        elif command.Response is None:
+            raise TypeError(f"Response must be provided as an argument for {command}")
+
+        if response_length is None:
+            return packet, DataLength, transfer_bytes
+        return packet, response_length, transfer_bytes
+
+
+class CommandIndex(dict):
+    # Command lookup table, filled from Command.all on first use instead of at import time
+    __slots__ = "keys_of", "filled"
+
+    def __init__(self, keys_of: typing.Callable[["Command"], typing.Iterable]):
+        super().__init__()
+        self.keys_of = keys_of
+        self.filled = False
+
+    def fill(self) -> "CommandIndex":
+        if not self.filled:
+            self.filled = True
+            for command in Command.all:
+                self.add(command)
+        return self
+
+    def add(self, command: "Command") -> None:
+        for key in self.keys_of(command):
+            dict.__setitem__(self, key, command)
+
+    def __getitem__(self, key):
+        return dict.__getitem__(self.fill(), key)
+
+    def __contains__(self, key):
+        return dict.__contains__(self.fill(), key)
+
+    def __iter__(self):
+        return dict.__iter__(self.fill())
+
+    def __len__(self):
+        return dict.__len__(self.fill())
+
+    def __repr__(self):
+        return dict.__repr__(self.fill())
+
+    def get(self, key, default=None):
+        return dict.get(self.fill(), key, default)
+
+    def keys(self):
+        return dict.keys(self.fill())
+
+    def values(self):
+        return dict.values(self.fill())
+
+    def items(self):
+        return dict.items(self.fill())
+
+
+class DerivedDataLength:
+    # Command.DataLength: as given, or else worked out from Response/Transfer on first read,
+    # so registering a Command at import time never asks construct for a sizeof()
+    __slots__ = ()
+
+    def __get__(self, command: typing.Optional["Command"], owner=None) -> typing.Optional[int]:
+        if command is None:
+            return None  # the dataclass default
+
+        try:
+            return command.__dict__["DataLength"]
+        except KeyError:
+            pass
+
+        data_length = None
+        try:
+            if command.Transferless:
+                if command.Response:
+                    data_length = command.Response.sizeof()
+            elif command.Transfer:
+                data_length = construct.Sequence(**command.Transfer).sizeof()
+        except construct.SizeofError:
+            pass
+
+        command.__dict__["DataLength"] = data_length
+        return data_length
+
+    def __set__(self, command: "Command", value: typing.Optional[int]) -> None:
+        if value is not None:
+            command.__dict__["DataLength"] = value
+
+
+def _command_bytes(command: "Command") -> bytes:
+    # Same as Command.struct.build, without going through construct
+    return bytes((command.Code & 0x7F | (command.Transferless & 0b1) << 7, int(command.Facility)))
+
+
 @dataclasses.dataclass(frozen=True)
 class Command:
     Facility: Facility
@@ -52,16 +308,31 @@ class Command:
     Transferless: bool
 
     Name: typing.Optional[str] = None
-    DataLength: typing.Optional[int] = None
+    DataLength: typing.Optional[int] = DerivedDataLength()
     Arguments: typing.Optional[typing.Dict[str, construct.Construct]] = None
     Transfer: typing.Optional[typing.Dict[str, construct.Construct]] = None
     Response: typing.Optional[construct.Construct] = None
+    Immutable: bool = False  # same answer for the life of the device (and its firmware)
 
-    from_name: typing.ClassVar = typing.cast(typing.Dict[str, "Command"], {})
-    from_bytes: typing.ClassVar = typing.cast(typing.Dict[bytes, "Command"], {})
-    from_int: typing.ClassVar = typing.cast(typing.Dict[int, "Command"], {})
+    from_name: typing.ClassVar = typing.cast(
+        typing.Dict[str, "Command"],
+        CommandIndex(lambda command: () if command.Name is None else (command.Name,)),
+    )
+    from_bytes: typing.ClassVar = typing.cast(
+        typing.Dict[bytes, "Command"], CommandIndex(lambda command: (_command_bytes(command),))
+    )
+    from_int: typing.ClassVar = typing.cast(
+        typing.Dict[int, "Command"],
+        CommandIndex(lambda command: (int.from_bytes(_command_bytes(command), "little"),)),
+    )
     from_fields: typing.ClassVar = typing.cast(
-        typing.Dict[typing.Tuple[Facility, int, bool], "Command"], {}
+        typing.Dict[typing.Tuple[Facility, int, bool], "Command"],
+        CommandIndex(
+            lambda command: (
+                (command.Facility, command.Code, command.Transferless),
+                (int(command.Facility), command.Code, command.Transferless),
+            )
+        ),
     )
     all: typing.ClassVar = typing.cast(typing.List["Command"], [])
 
@@ -162,37 +433,16 @@ class Command:
         return hash((self.Facility, self.Code, self.Transferless))
 
     def __post_init__(self):
-        as_bytes = self.struct.build(vars(self))
-        self.from_bytes[as_bytes] = self
-
-        as_int = Int16ul.parse(as_bytes)
-        self.from_int[as_int] = self
-
-        if self.Name is not None:
-            self.from_name[self.Name] = self
-
-        key = self.Facility, self.Code, self.Transferless
-        int_key = int(self.Facility), self.Code, self.Transferless
-        self.from_fields[key] = self
-        self.from_fields[int_key] = self
-
         self.all.append(self)
 
-        if self.DataLength is None:
-            if self.Transferless:
-                if self.Response:
-                    try:
-                        object.__setattr__(self, "DataLength", self.Response.sizeof())
-                    except construct.SizeofError:
-                        pass
-            else:
-                if self.Transfer:
-                    try:
-                        object.__setattr__(
-                            self, "DataLength", construct.Sequence(**self.Transfer).sizeof()
-                        )
-                    except construct.SizeofError:
-                        pass
+        # Lookup tables are built on first use, only those already built need this Command now
+        for index in (self.from_name, self.from_bytes, self.from_int, self.from_fields):
+            if index.filled:
+                index.add(self)
+
+    @functools.cached_property
+    def encoder(self) -> CommandEncoder:
+        return CommandEncoder(self)
 
     @staticmethod
     def parse_command_packet(data: bytes):
@@ -202,7 +452,14 @@ class Command:
 
     def build_command_packet(
         self, **kwargs
-    ) -> typing.Tuple[bytes, int, typing.Optional[bytearray]]:
+    ) -> typing.Tuple[bytes, int, typing.Optional[typing.Union[bytes, bytearray, memoryview]]]:
+
+        encoder = self.encoder
+        if encoder.compiled and not kwargs.keys() & {"Arguments", "Transfer"}:
+            try:
+                return encoder(kwargs)
+            except struct.error:
+                pass  # construct words the error better
 
         DataLength = kwargs.get("DataLength") or self.DataLength
 
@@ -230,7 +487,16 @@ class Command:
                 raise TypeError(f"Transfer must be provided as an argument for {self}")
 
         transfer_bytes = None
-        if transfer_prototype is not None:
+        if transfer_prototype is not None and _is_raw_transfer(transfer_prototype):
+            # Hand raw payloads (firmware images, mmapped files...) through without copying
+            (argument_name,) = transfer_prototype
+            if argument_name not in kwargs:
+                raise TypeError(f"{argument_name} must be provided as an argument for {self}")
+
+            transfer_bytes = memoryview(kwargs[argument_name]).cast("B")
+            DataLength = DataLength or len(transfer_bytes)
+
+        elif transfer_prototype is not None:
             transfer_bytes = bytearray()
 
             for argument_name, subcon in transfer_prototype.items():
@@ -261,9 +527,7 @@ class Command:
             response_length = DataLength
 
         return (
-            self.packet_struct.build(
-                dict(vars(self), DataLength=DataLength, Arguments=argument_bytes)
-            ),
+            encoder.header + Int32ul.build(DataLength) + argument_bytes,
             response_length,
             transfer_bytes,
         )
@@ -301,6 +565,7 @@ CoreModuleGetUniqueID = Command(
     Facility=Facility.LibraryJutil,
     Code=2,
     Transferless=True,
+    Immutable=True,
     Response=Prefixed(
         Int8ul,
         construct.Struct(
@@ -1282,6 +1547,7 @@ GetProductSerialNumber = Command(
     Facility=Facility.LibraryConfiguration,
     Code=8,
     Transferless=True,
+    Immutable=True,
     Response=PaddedString(12, "ascii"),
 )
 
@@ -1295,6 +1561,7 @@ GetPcbId = Command(
     Facility=Facility.LibraryConfiguration,
     Code=11,
     Transferless=True,
+    Immutable=True,
     Response=Int64ul,
 )
 
@@ -1309,6 +1576,7 @@ GetBluetoothMac = Command(
     Facility=Facility.LibraryConfiguration,
     Code=13,
     Transferless=True,
+    Immutable=True,
     Response=Int64ul,
 )
 
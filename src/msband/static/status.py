@@ -1,3 +1,4 @@
+import struct
 import construct
 from enum import Enum, IntEnum
 from msband.static import BoolAdapter
@@ -1673,3 +1674,29 @@ class Status(Enum):
     AppMainResetReasonFailedInitialization = (True, Severity.Error, Facility.ApplicationsBase, 0)
 
     App2UpResetReasonSramUpdateComplete = (True, Severity.Error, Facility.Application2UP, 0)
+
+
+def status_word(status: Status) -> int:
+    # Raw trailer word after the magic, Code | higher half << 16, in its canonical encoding
+    customer, severity, facility, code = status.value
+    return code | (int(facility) | customer << 13 | severity << 15) << 16
+
+
+STATUS_INDEX = {status_word(status): status for status in Status}
+
+SUCCESS_TRAILER = StatusPacket.build(dict(Code=0))
+_TRAILER = struct.Struct("<HI")
+
+
+def parse_status(data) -> Status:
+    # Same result as StatusPacket.parse(data).Status, without building the Container
+    if data == SUCCESS_TRAILER:
+        return Status.Success
+
+    magic, word = _TRAILER.unpack_from(data)
+    if magic == STATUS_PACKET:
+        status = STATUS_INDEX.get(word)
+        if status is not None:
+            return status
+
+    return StatusPacket.parse(data).Status  # oddities, and the exceptions they raise
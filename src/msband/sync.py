@@ -0,0 +1,570 @@
+import os
+import json
+import time
+import zlib
+import typing
+import logging
+import pathlib
+import threading
+import collections
+import dataclasses
+import concurrent.futures
+from msband.static.command import (
+    LoggerGetChunkCounts,
+    LoggerGetChunkRangeMetadata,
+    LoggerGetChunkRangeData,
+    LoggerDeleteChunkRange,
+)
+from msband.static.status import Status
+from msband.protocol import ProtocolInterface, StatusError
+from msband.resilience import Backoff, ResilientInterface, is_retryable
+
+
+@dataclasses.dataclass(frozen=True)
+class ChunkRange:
+    start: int  # StartingSeqNumber
+    end: int  # EndingSeqNumber, inclusive
+    byte_count: int
+
+    @property
+    def chunks(self) -> int:
+        return self.end - self.start + 1
+
+    @property
+    def name(self) -> str:
+        return f"{self.start}-{self.end}.log"
+
+
+@dataclasses.dataclass(frozen=True)
+class SyncedRange:
+    range: ChunkRange
+    path: pathlib.Path
+    crc32: int
+
+
+@dataclasses.dataclass(frozen=True)
+class SyncReport:
+    chunks: int
+    bytes: int
+    elapsed: float
+    chunk_count: int  # what the next batch asks for
+    synced: typing.Tuple[SyncedRange, ...]
+    recovered: typing.Tuple[SyncedRange, ...] = ()  # left on disk by an earlier sync, not fetched
+
+    @property
+    def chunks_per_second(self) -> float:
+        if not self.elapsed:
+            return 0.0
+        return self.chunks / self.elapsed
+
+    @property
+    def bytes_per_second(self) -> float:
+        if not self.elapsed:
+            return 0.0
+        return self.bytes / self.elapsed
+
+
+SyncProgressCallback = typing.Callable[[SyncReport], None]
+
+
+class RangeMismatch(ValueError):
+    # The Band doesn't count ranges from its oldest chunk, as pipelining needs
+    ...
+
+
+def fsync_directory(path: pathlib.Path) -> None:
+    # Makes the rename itself durable, not every platform can open a directory
+    try:
+        descriptor = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(descriptor)
+    except OSError:
+        pass
+    finally:
+        os.close(descriptor)
+
+
+class SyncJournal:
+    # Write-ahead log of a sync folder, one JSON record per line:
+    # "written" goes down (fsync'd) before a .log file is renamed into place, "deleted" once the
+    # Band dropped the range, "dropped" when a written range turned out not to be usable
+    # A "deleted" record lost in a crash is harmless, the Band tells the range is gone
+    __slots__ = "folder", "path", "file", "lock"
+
+    NAME = "sync.journal"
+
+    def __init__(self, folder: pathlib.Path):
+        self.folder = folder
+        self.path = folder / self.NAME
+        self.file: typing.Optional[typing.TextIO] = None
+        self.lock = threading.Lock()
+
+    def __enter__(self) -> "SyncJournal":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def records(self) -> typing.Iterator[typing.Dict[str, typing.Any]]:
+        if not self.path.exists():
+            return
+
+        with self.path.open() as file:
+            for line in file:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    logging.warning(f"Ignoring torn record in {self.path}: {line!r}")
+
+    def outstanding(self) -> typing.List[SyncedRange]:
+        # Written but not deleted yet, oldest first
+        written: typing.Dict[typing.Tuple[int, int], SyncedRange] = {}
+
+        for record in self.records():
+            key = record["start"], record["end"]
+            if record["event"] == "written":
+                chunk_range = ChunkRange(record["start"], record["end"], record["bytes"])
+                written[key] = SyncedRange(
+                    chunk_range, self.folder / chunk_range.name, record["crc32"]
+                )
+            else:
+                written.pop(key, None)
+
+        return sorted(written.values(), key=lambda synced: synced.range.start)
+
+    def append(self, record: typing.Dict[str, typing.Any], durable: bool) -> None:
+        with self.lock:
+            if self.file is None:
+                self.file = self.path.open("a")
+
+            self.file.write(json.dumps(record) + "\n")
+            self.file.flush()
+            if durable:
+                os.fsync(self.file.fileno())
+
+    def written(self, synced: SyncedRange) -> None:
+        chunk_range = synced.range
+        record = dict(start=chunk_range.start, end=chunk_range.end, bytes=chunk_range.byte_count)
+        self.append(dict(event="written", crc32=synced.crc32, **record), durable=True)
+
+    def deleted(self, chunk_range: ChunkRange) -> None:
+        self.append(dict(event="deleted", start=chunk_range.start, end=chunk_range.end), False)
+
+    def dropped(self, chunk_range: ChunkRange) -> None:
+        self.append(dict(event="dropped", start=chunk_range.start, end=chunk_range.end), True)
+
+    def compact(self) -> None:
+        # Keeps only what's still outstanding, so the journal doesn't grow with every sync
+        outstanding = self.outstanding()
+
+        with self.lock:
+            self.close()
+            temporary = self.path.with_name(f"{self.NAME}.tmp")
+            with temporary.open("w") as file:
+                for synced in outstanding:
+                    chunk_range = synced.range
+                    record = dict(
+                        event="written",
+                        crc32=synced.crc32,
+                        start=chunk_range.start,
+                        end=chunk_range.end,
+                        bytes=chunk_range.byte_count,
+                    )
+                    file.write(json.dumps(record) + "\n")
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temporary, self.path)
+            fsync_directory(self.folder)
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def persist(
+    folder: pathlib.Path, chunk_range: ChunkRange, data: bytes, journal: SyncJournal
+) -> SyncedRange:
+    # Written under a temporary name and renamed, so a .log file on disk is always complete
+    # The journal hears of it before the rename: a .log file is never there without its record
+    path = folder / chunk_range.name
+    partial = path.with_name(f"{path.name}.part")
+
+    with partial.open("wb") as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+
+    synced = SyncedRange(chunk_range, path, zlib.crc32(data))
+    journal.written(synced)
+
+    os.replace(partial, path)
+    fsync_directory(folder)
+
+    return synced
+
+
+def restore(synced: SyncedRange) -> bool:
+    # Whether the file of a journalled range is intact, finishing its rename if the crash came first
+    partial = synced.path.with_name(f"{synced.path.name}.part")
+
+    for candidate in (synced.path, partial):
+        try:
+            data = candidate.read_bytes()
+        except FileNotFoundError:
+            continue
+
+        if len(data) == synced.range.byte_count and zlib.crc32(data) == synced.crc32:
+            if candidate is partial:
+                os.replace(partial, synced.path)
+                fsync_directory(synced.path.parent)
+            return True
+
+    return False
+
+
+@dataclasses.dataclass(frozen=True)
+class TransportProfile:
+    initial: int
+    minimum: int
+    maximum: int
+    step: int  # added after every full batch that didn't cost throughput
+    target_rtt: float  # seconds per batch, bounds what a failed batch costs to redo
+
+
+TRANSPORT_PROFILES = {
+    "usb": TransportProfile(initial=512, minimum=32, maximum=8192, step=64, target_rtt=1.0),
+    "rfcomm": TransportProfile(initial=128, minimum=16, maximum=2048, step=16, target_rtt=2.0),
+    "ble": TransportProfile(initial=32, minimum=8, maximum=512, step=8, target_rtt=2.0),
+}
+DEFAULT_PROFILE = TransportProfile(initial=128, minimum=8, maximum=2048, step=16, target_rtt=2.0)
+
+
+def transport_of(iband: ProtocolInterface) -> str:
+    identity = iband.identity
+    return type(iband).__name__ if identity is None else identity.split(":", 1)[0]
+
+
+class ChunkCountController:
+    # AIMD on the ChunkCount of each batch: grows by a step while full batches stay within the
+    # round trip budget without losing throughput, shrinks by a factor on failures and slow batches
+    # Flaky links get a smaller budget, so the batch a failure throws away is smaller too
+    __slots__ = "profile", "chunk_count", "rtt", "throughput", "error_rate"
+
+    SMOOTHING = 0.3  # weight of the newest sample
+    DECREASE = 0.5
+    TOLERANCE = 0.95  # throughput still counts as not lost
+
+    def __init__(self, profile: TransportProfile, chunk_count: typing.Optional[int] = None):
+        self.profile = profile
+        self.chunk_count = self.clamp(profile.initial if chunk_count is None else chunk_count)
+        self.rtt: typing.Optional[float] = None
+        self.throughput: typing.Optional[float] = None  # bytes per second
+        self.error_rate = 0.0
+
+    def clamp(self, chunk_count: int) -> int:
+        return max(self.profile.minimum, min(self.profile.maximum, int(chunk_count)))
+
+    def smooth(self, average: typing.Optional[float], sample: float) -> float:
+        if average is None:
+            return sample
+        return average + self.SMOOTHING * (sample - average)
+
+    @property
+    def budget(self) -> float:
+        return self.profile.target_rtt * (1 - self.error_rate)
+
+    def success(self, requested: int, chunks: int, byte_count: int, elapsed: float) -> int:
+        throughput = byte_count / elapsed if elapsed else 0.0
+        previous = self.throughput
+
+        self.error_rate = self.smooth(self.error_rate, 0.0)
+        self.rtt = self.smooth(self.rtt, elapsed)
+        self.throughput = self.smooth(self.throughput, throughput)
+
+        if elapsed > self.budget:
+            # Scale towards the budget, but never faster than a failure would
+            scale = max(self.DECREASE, self.budget / elapsed)
+            self.chunk_count = self.clamp(self.chunk_count * scale)
+        elif chunks < requested:
+            pass  # the Band ran out of chunks, says nothing about the link
+        elif previous is None or throughput >= previous * self.TOLERANCE:
+            self.chunk_count = self.clamp(self.chunk_count + self.profile.step)
+
+        return self.chunk_count
+
+    def failure(self) -> int:
+        self.error_rate = self.smooth(self.error_rate, 1.0)
+        self.chunk_count = self.clamp(self.chunk_count * self.DECREASE)
+        return self.chunk_count
+
+
+class LogSync:
+    # Downloads logger chunks into a folder, deleting them from the Band once they're on disk
+    # Writing, checksumming and fsyncing a batch happen on a writer thread while the next batch is
+    # fetched; a range is only deleted from the Band after its file was fsync'd
+    # Without a chunk_count, batch sizes adapt to the link and are remembered in iband.cache
+    # A journal in the folder lets a sync that died pick up without downloading anything again
+    __slots__ = (
+        "iband",
+        "folder",
+        "journal",
+        "controller",
+        "adaptive",
+        "depth",
+        "progress",
+        "backoff",
+        "resilient",
+    )
+
+    def __init__(
+        self,
+        iband: ProtocolInterface,
+        folder: typing.Union[str, os.PathLike],
+        chunk_count: typing.Optional[int] = None,
+        depth: int = 2,
+        progress: typing.Optional[SyncProgressCallback] = None,
+        backoff: typing.Optional[Backoff] = Backoff(),
+    ):
+        self.iband = iband
+        self.folder = pathlib.Path(folder)
+        self.journal = SyncJournal(self.folder)
+        self.depth = depth  # batches fetched but not yet deleted
+        self.progress = progress
+        self.backoff = backoff  # None gives up on the first transport failure
+        self.resilient = None if backoff is None else ResilientInterface(iband, backoff)
+
+        # A fixed chunk_count is a profile with nowhere to move
+        self.adaptive = chunk_count is None
+        profile = TRANSPORT_PROFILES.get(transport_of(iband), DEFAULT_PROFILE)
+        if not self.adaptive:
+            profile = dataclasses.replace(profile, minimum=chunk_count, maximum=chunk_count)
+        self.controller = ChunkCountController(profile, chunk_count)
+
+    @property
+    def setting_key(self) -> str:
+        return f"ChunkCount:{transport_of(self.iband)}"
+
+    def next_range(self, pending: typing.Sequence[ChunkRange]) -> typing.Optional[ChunkRange]:
+        # Ranges are counted from the oldest chunk still on the Band, so while earlier batches
+        # aren't deleted yet, ask for them plus the next batch and keep only the new part
+        pending_chunks = sum(chunk_range.chunks for chunk_range in pending)
+        pending_bytes = sum(chunk_range.byte_count for chunk_range in pending)
+
+        metadata = self.iband.command(
+            LoggerGetChunkRangeMetadata, ChunkCount=pending_chunks + self.controller.chunk_count
+        )
+        if not metadata.ByteCount:
+            return None
+
+        if not pending:
+            return ChunkRange(
+                metadata.StartingSeqNumber, metadata.EndingSeqNumber, metadata.ByteCount
+            )
+
+        start = pending[-1].end + 1
+        if (
+            metadata.StartingSeqNumber != pending[0].start
+            or metadata.ByteCount < pending_bytes
+            or metadata.EndingSeqNumber < start - 1
+        ):
+            raise RangeMismatch(f"Unexpected chunk range metadata {metadata} after {pending}")
+
+        if metadata.EndingSeqNumber < start:
+            return None
+        return ChunkRange(start, metadata.EndingSeqNumber, metadata.ByteCount - pending_bytes)
+
+    def fetch(self, chunk_range: ChunkRange) -> bytes:
+        return self.iband.command(
+            LoggerGetChunkRangeData,
+            StartingSeqNumber=chunk_range.start,
+            EndingSeqNumber=chunk_range.end,
+            DataLength=chunk_range.byte_count,
+        )
+
+    def delete(self, chunk_range: ChunkRange) -> None:
+        # Only journalled once the Band said yes, a refused range stays outstanding
+        # A retry first checks the range is still there, the lost answer may have been a yes
+        attempts = 0
+
+        def delete(iband: ProtocolInterface) -> None:
+            nonlocal attempts
+            attempts += 1
+            if attempts > 1:
+                metadata = iband.command(LoggerGetChunkRangeMetadata, ChunkCount=chunk_range.chunks)
+                if not metadata.ByteCount or metadata.StartingSeqNumber > chunk_range.end:
+                    return
+
+            status = iband.command(
+                LoggerDeleteChunkRange,
+                StartingSeqNumber=chunk_range.start,
+                EndingSeqNumber=chunk_range.end,
+                ByteCount=chunk_range.byte_count,
+            )
+            if status is not Status.Success:
+                raise StatusError(status)
+
+        if self.resilient is None:
+            delete(self.iband)
+        else:
+            self.resilient.call(delete)
+        self.journal.deleted(chunk_range)
+
+    def recover(self) -> typing.List[SyncedRange]:
+        # Ranges an earlier sync got on disk but not deleted from the Band are deleted now
+        recovered = []
+
+        for synced in self.journal.outstanding():
+            chunk_range = synced.range
+            if not restore(synced):
+                logging.warning(f"{chunk_range.name} didn't make it to disk, fetching it again")
+                self.journal.dropped(chunk_range)
+                continue
+
+            metadata = self.iband.command(
+                LoggerGetChunkRangeMetadata, ChunkCount=chunk_range.chunks
+            )
+            held = metadata.StartingSeqNumber, metadata.EndingSeqNumber, metadata.ByteCount
+
+            if not metadata.ByteCount or metadata.StartingSeqNumber > chunk_range.end:
+                self.journal.deleted(chunk_range)  # only the record of it was lost
+            elif held == (chunk_range.start, chunk_range.end, chunk_range.byte_count):
+                self.delete(chunk_range)
+            else:
+                # The file stays, whatever the Band holds now is fetched as usual
+                logging.warning(f"Band holds {held} instead of {chunk_range}, fetching it again")
+                self.journal.dropped(chunk_range)
+                continue
+
+            recovered.append(synced)
+            logging.info(f"Recovered {chunk_range.name} without fetching it")
+
+        # Renames that never happened and have no record, the Band still holds their chunks
+        for partial in self.folder.glob("*.log.part"):
+            partial.unlink()
+
+        self.journal.compact()
+        return recovered
+
+    def warm_up(self) -> typing.Optional[str]:
+        # Starts from what the last sync learnt, returns the serial to store the tuning under
+        if not self.adaptive or self.iband.cache is None:
+            return None
+
+        serial = self.iband.device_serial()
+        stored = self.iband.cache.setting(serial, self.setting_key)
+        if stored is not None:
+            self.controller.chunk_count = self.controller.clamp(stored)
+        return serial
+
+    def run(self) -> SyncReport:
+        self.folder.mkdir(parents=True, exist_ok=True)
+
+        started = time.perf_counter()
+        serial = self.warm_up()
+        recovered = self.recover()
+        remaining = self.iband.command(LoggerGetChunkCounts).LoggedChunkCount
+        synced: typing.List[SyncedRange] = []
+        writes: typing.Deque[
+            typing.Tuple[ChunkRange, "concurrent.futures.Future[SyncedRange]"]
+        ] = collections.deque()
+        pipelined = True
+
+        attempt = 0
+
+        def report() -> SyncReport:
+            return SyncReport(
+                chunks=sum(s.range.chunks for s in synced),
+                bytes=sum(s.range.byte_count for s in synced),
+                elapsed=time.perf_counter() - started,
+                chunk_count=self.controller.chunk_count,
+                synced=tuple(synced),
+                recovered=tuple(recovered),
+            )
+
+        def retire(block: bool) -> None:
+            # Deletes every batch that is durable on disk, oldest first
+            while writes and (block or writes[0][1].done()):
+                chunk_range, write = writes.popleft()
+                synced.append(write.result())
+                self.delete(chunk_range)
+                block = False
+                if self.progress is not None:
+                    self.progress(report())
+
+        try:
+            with concurrent.futures.ThreadPoolExecutor(
+                1, thread_name_prefix="msband-sync"
+            ) as writer:
+                while remaining > 0:
+                    retire(block=len(writes) >= self.depth or not pipelined)
+
+                    pending = [chunk_range for chunk_range, _ in writes]
+                    requested = self.controller.chunk_count
+                    batch_started = time.perf_counter()
+                    try:
+                        chunk_range = self.next_range(pending)
+                        data = None if chunk_range is None else self.fetch(chunk_range)
+                    except RangeMismatch as e:
+                        # This Band doesn't count ranges the way next_range expects
+                        # Other ValueErrors, e.g. a malformed answer to the fetch, aren't a fallback
+                        logging.warning(f"Falling back to one batch at a time: {e}")
+                        pipelined = False
+                        while writes:
+                            retire(block=True)
+                        continue
+                    except Exception as e:
+                        # Nothing of this batch was deleted, so it's simply asked for again, smaller
+                        if self.resilient is None or not is_retryable(e):
+                            raise
+                        self.controller.failure()
+                        logging.warning(
+                            f"Batch failed, retrying {self.controller.chunk_count} chunks: {e!r}"
+                        )
+                        attempt = self.resilient.reconnect(attempt)
+                        continue
+
+                    if chunk_range is None:
+                        if not writes:
+                            break
+                        # Either nothing's left or the Band caps the range, only an empty one tells
+                        while writes:
+                            retire(block=True)
+                        continue
+
+                    attempt = 0
+                    self.controller.success(
+                        requested,
+                        chunk_range.chunks,
+                        chunk_range.byte_count,
+                        time.perf_counter() - batch_started,
+                    )
+                    writes.append(
+                        (
+                            chunk_range,
+                            writer.submit(persist, self.folder, chunk_range, data, self.journal),
+                        )
+                    )
+                    remaining -= chunk_range.chunks
+                    logging.debug(f"Fetched {chunk_range}")
+
+                while writes:
+                    retire(block=True)
+
+            self.journal.compact()
+
+        finally:
+            self.journal.close()
+            if serial is not None:
+                self.iband.cache.store_setting(
+                    serial, self.setting_key, self.controller.chunk_count
+                )
+
+        result = report()
+        logging.info(
+            f"Synced {result.chunks} chunks, {result.bytes} bytes in {result.elapsed:.2f}s "
+            f"({result.chunks_per_second:.1f} chunks/s, {result.bytes_per_second / 1024:.1f} KiB/s)"
+        )
+        return result
@@ -0,0 +1,54 @@
+import typing
+from msband.static.command import Command
+from msband.static.status import Status
+from msband.protocol import ProtocolInterface, StatusError
+from msband.protocol.core import ProgressCallback, StreamExchange
+
+Answer = typing.Union[bytes, typing.Callable[[bytes, typing.Optional[bytes]], bytes]]
+
+
+class ScriptedBand(ProtocolInterface):
+    # Answers each Command from a table, no transport underneath
+    __slots__ = "answers", "statuses", "name", "asked"
+
+    def __init__(
+        self,
+        answers: typing.Dict[Command, Answer],
+        statuses: typing.Optional[typing.Dict[Command, Status]] = None,
+        name: typing.Optional[str] = None,
+    ):
+        super().__init__()
+        self.answers = answers
+        self.statuses = statuses or {}
+        self.name = name
+        self.asked: typing.List[Command] = []
+
+    @property
+    def identity(self) -> typing.Optional[str]:
+        return self.name
+
+    def communicate(
+        self,
+        data: bytes,
+        response_length: int,
+        transfer: bytes = None,
+        progress: typing.Optional[ProgressCallback] = None,
+    ) -> typing.Tuple[memoryview, Status]:
+        command = Command.from_bytes[bytes(data[2:4])]
+        self.asked.append(command)
+
+        answer = self.answers.get(command, b"")
+        if callable(answer):
+            answer = answer(bytes(data), None if transfer is None else bytes(transfer))
+
+        response = bytes(answer).ljust(response_length, b"\0")[:response_length]
+        return memoryview(response), self.statuses.get(command, Status.Success)
+
+    def drive_stream(self, exchange: StreamExchange) -> typing.Iterator[memoryview]:
+        # The whole answer at once, handed out in chunks of the exchange's buffer size
+        result_bytes, status = self.communicate(exchange.data, exchange.response_length)
+        chunk_size = len(exchange.buffers[0])
+        for offset in range(0, len(result_bytes), chunk_size):
+            yield result_bytes[offset : offset + chunk_size]
+        if status.value[1] != 0:
+            raise StatusError(status)
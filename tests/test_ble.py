@@ -0,0 +1,148 @@
+import struct
+import asyncio
+import pytest
+from zippy_mock import MockZippyClient
+from msband.protocol import BLEv2Interface
+from msband.protocol.zippy import FragmentReassembler
+from msband.static.command import EFlashRead, GetPcbId, SRAMFWUpdateLoadData, Pass
+from msband.static.constants import BandType
+
+bleak = pytest.importorskip("bleak")
+
+
+class Flash:
+    # Answers EFlashRead with a counting pattern and keeps every firmware transfer it's sent
+    def __init__(self):
+        self.loaded = bytearray()
+
+    def __call__(self, command, arguments, transfer):
+        if command is GetPcbId:
+            return (26).to_bytes(8, "little")
+        if command is EFlashRead:
+            address, length = struct.unpack("<II", arguments)
+            return pattern(address, length)
+        if command is SRAMFWUpdateLoadData:
+            self.loaded += transfer
+        return b""
+
+
+def pattern(address: int, length: int) -> bytes:
+    return bytes((address + i) % 251 for i in range(length))
+
+
+def connect(monkeypatch, streaming=False, **kwargs):
+    flash = Flash()
+    client = MockZippyClient(flash, **kwargs)
+    monkeypatch.setattr(bleak, "BleakClient", lambda id: client)
+
+    async def acquire():
+        band = BLEv2Interface(streaming=streaming)
+        await band.acquire("mock")
+        return band
+
+    return flash, client, acquire
+
+
+def test_acquire_knows_the_band_type(monkeypatch):
+    _, _, acquire = connect(monkeypatch)
+    assert asyncio.run(acquire()).band_type is BandType.Envoy
+
+
+def test_session_locks_once_for_every_command_inside(monkeypatch):
+    _, client, acquire = connect(monkeypatch)
+
+    async def run():
+        band = await acquire()
+        locks = client.writes["lock"]
+        async with band.session():
+            for _ in range(5):
+                await band.command(GetPcbId)
+            await band.batch([(GetPcbId, {})] * 5)
+        return client.writes["lock"] - locks
+
+    # Lock and unlock, not one pair per command
+    assert asyncio.run(run()) == 2
+
+
+def test_firmware_transfer_is_pipelined(monkeypatch):
+    flash, client, acquire = connect(monkeypatch, max_aligned=20, credits=4)
+    firmware = pattern(0, 5000)
+
+    async def run():
+        band = await acquire()
+        writes = dict(client.writes)
+        await band.command(SRAMFWUpdateLoadData, UpdateFileStream=firmware, Response=Pass)
+        return {key: client.writes[key] - writes[key] for key in writes}
+
+    writes = asyncio.run(run())
+    assert flash.loaded == firmware
+    # The transfer itself goes out unacknowledged, with one control write per window rather than
+    # one per fragment, and running out of credits never overruns the Band
+    assert writes["no_response"] > 5000 // 20
+    assert writes["control"] < 5000 // 20
+
+
+@pytest.mark.parametrize("swap", [False, True])
+def test_responses_are_reassembled_in_any_fragment_order(monkeypatch, swap):
+    _, _, acquire = connect(monkeypatch, max_aligned=20, swap=swap)
+
+    async def run():
+        band = await acquire()
+        return await band.command(EFlashRead, Address=7, DataLength=333)
+
+    assert bytes(asyncio.run(run())) == pattern(7, 333)
+
+
+def test_streaming_sends_commands_on_credits(monkeypatch):
+    _, client, acquire = connect(monkeypatch, streaming=True, max_aligned=20, credits=2)
+
+    async def run():
+        band = await acquire()
+        acknowledged = client.writes["response"]
+        async with band.session():
+            credits = band.credits
+            answers = [await band.command(GetPcbId) for _ in range(10)]
+        # Only the lock, unlock and the R buffer write in refresh_buffers wait for the Band
+        return credits, answers, client.writes["response"] - acknowledged
+
+    credits, answers, acknowledged = asyncio.run(run())
+    assert credits == 2
+    assert answers == [26] * 10
+    assert acknowledged == 3
+
+
+def test_command_stream_hands_over_whole_messages(monkeypatch):
+    _, _, acquire = connect(monkeypatch, max_aligned=20)
+
+    async def run():
+        band = await acquire()
+        chunks = bytearray()
+        async for chunk in band.command_stream(
+            EFlashRead, chunk_size=100, Address=3, DataLength=250
+        ):
+            chunks += chunk
+        return bytes(chunks)
+
+    assert asyncio.run(run()) == pattern(3, 250)
+
+
+def test_reassembler_places_early_fragments_once_their_turn_comes():
+    async def run():
+        reassembler = FragmentReassembler()
+        reassembler.feed(1, memoryview(b"world"))
+        reassembler.expect(10)
+        reassembler.feed(0, memoryview(b"hello"))
+        return bytes(await (await reassembler.messages.get()))
+
+    assert asyncio.run(run()) == b"helloworld"
+
+
+def test_reassembler_refuses_fragments_past_the_announced_length():
+    async def run():
+        reassembler = FragmentReassembler()
+        reassembler.expect(4)
+        reassembler.feed(0, memoryview(b"too long"))
+        await (await reassembler.messages.get())
+
+    with pytest.raises(ValueError):
+        asyncio.run(run())
@@ -0,0 +1,87 @@
+from bands import ScriptedBand
+from msband.cache import DeviceCache
+from msband.static.status import Status
+from msband.static.command import (
+    CoreModuleGetVersion,
+    GetPcbId,
+    GetProductSerialNumber,
+    SRAMFWUpdateBootIntoUpdateMode,
+)
+
+SERIAL = b"000123456789"
+
+
+def connect(cache: DeviceCache, version: bytes, pcb_id: int) -> ScriptedBand:
+    iband = ScriptedBand(
+        {
+            CoreModuleGetVersion: version,
+            GetProductSerialNumber: SERIAL,
+            GetPcbId: bytes([pcb_id]),
+        },
+        name="usb:band",
+    )
+    iband.cache = cache
+    return iband
+
+
+def test_immutable_answers_are_cached():
+    iband = connect(DeviceCache(None), b"1.0", 26)
+
+    assert iband.command(GetPcbId) == 26
+    assert iband.command(GetPcbId) == 26
+    assert iband.asked.count(GetPcbId) == 1
+
+
+def test_firmware_version_is_asked_once_per_connection():
+    cache = DeviceCache(None)
+    iband = connect(cache, b"1.0", 26)
+
+    iband.command(GetPcbId)
+    iband.command(GetPcbId)
+    assert iband.asked.count(CoreModuleGetVersion) == 1
+
+    iband.acquire()  # reconnected
+    iband.command(GetPcbId)
+    assert iband.asked.count(CoreModuleGetVersion) == 2
+
+
+def test_firmware_updated_elsewhere_drops_stale_answers():
+    cache = DeviceCache(None)
+    assert connect(cache, b"1.0", 26).command(GetPcbId) == 26
+
+    # Updated by another tool between the two connections
+    updated = connect(cache, b"2.0", 31)
+    assert updated.command(GetPcbId) == 31
+    assert GetPcbId in updated.asked
+
+    # Same firmware again, the new answer is cached
+    again = connect(cache, b"2.0", 99)
+    assert again.command(GetPcbId) == 31
+    assert GetPcbId not in again.asked
+
+
+def test_firmware_update_forgets_without_asking_the_updater():
+    cache = DeviceCache(None)
+    iband = connect(cache, b"1.0", 26)
+    iband.command(GetPcbId)
+
+    # Reconnected to the updater app, which doesn't answer identity queries
+    iband.acquire()
+    iband.statuses[CoreModuleGetVersion] = Status.NotInOobe
+    iband.statuses[GetProductSerialNumber] = Status.NotInOobe
+    iband.asked.clear()
+
+    assert iband.command(SRAMFWUpdateBootIntoUpdateMode) is Status.Success
+    assert iband.asked == [SRAMFWUpdateBootIntoUpdateMode]
+    assert cache.serial_for("usb:band") is None
+
+
+def test_cache_failures_never_block_a_firmware_update():
+    class BrokenCache(DeviceCache):
+        def forget(self, serial) -> None:
+            raise OSError("read-only cache")
+
+    iband = connect(BrokenCache(None), b"1.0", 26)
+    iband.command(GetPcbId)
+
+    assert iband.command(SRAMFWUpdateBootIntoUpdateMode) is Status.Success
@@ -0,0 +1,23 @@
+import os
+import sys
+import msband
+import subprocess
+from msband.static.command import GetPcbId, LoggerDeleteChunkRange, SRAMFWUpdateLoadData
+
+
+def test_data_length_is_derived_on_first_read():
+    # In a fresh interpreter, where no other test has read a DataLength yet
+    check = (
+        "from msband.static.command import GetPcbId\n"
+        "assert 'DataLength' not in GetPcbId.__dict__\n"
+        "assert GetPcbId.DataLength == 8 and GetPcbId.__dict__['DataLength'] == 8\n"
+    )
+    source = os.path.dirname(os.path.dirname(msband.__file__))
+    subprocess.run([sys.executable, "-c", check], check=True, env={"PYTHONPATH": source})
+
+
+def test_data_length_given_or_derived():
+    assert GetPcbId.DataLength == 8  # from the Response
+    assert LoggerDeleteChunkRange.DataLength == 12  # given
+    assert SRAMFWUpdateLoadData.DataLength is None  # variable, the call decides
+    assert GetPcbId.build_command_packet()[0][4:8] == (8).to_bytes(4, "little")
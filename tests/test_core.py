@@ -0,0 +1,157 @@
+import struct
+import pytest
+from msband.static.status import Status, status_word
+from msband.static.command import GetPcbId, LoggerDeleteChunkRange, SRAMFWUpdateLoadData
+from msband.protocol.core import (
+    Exchange,
+    StreamExchange,
+    Send,
+    Need,
+    Data,
+    Done,
+    parse_result,
+    prepare_batch,
+)
+
+ERROR = Status.BadDataLength
+
+
+def trailer(status: Status = Status.Success) -> bytes:
+    return struct.pack("<HI", 0xA6FE, status_word(status))
+
+
+def send_command(exchange) -> None:
+    event = exchange.next_event()
+    assert isinstance(event, Send) and not event.raw
+    exchange.sent(len(event.data))
+
+
+def fill(exchange, data: bytes) -> None:
+    while data:
+        event = exchange.next_event()
+        assert isinstance(event, Need)
+        count = min(len(event.buffer), len(data))
+        event.buffer[:count] = data[:count]
+        exchange.received(count)
+        data = data[count:]
+
+
+def test_exchange_success():
+    exchange = Exchange(*GetPcbId.build_command_packet())
+    send_command(exchange)
+
+    need = exchange.next_event()
+    assert isinstance(need, Need) and len(need.buffer) == 8 + len(trailer())
+    fill(exchange, struct.pack("<Q", 26) + trailer())
+
+    done = exchange.next_event()
+    assert isinstance(done, Done) and done.status is Status.Success
+    assert parse_result(GetPcbId, done.response, done.status) == 26
+
+
+def test_exchange_error_status():
+    exchange = Exchange(*GetPcbId.build_command_packet())
+    send_command(exchange)
+    fill(exchange, bytes(8) + trailer(ERROR))
+
+    done = exchange.next_event()
+    assert done.status is ERROR
+    assert parse_result(GetPcbId, done.response, done.status) == (bytes(8), ERROR)
+
+
+def test_exchange_short_reads():
+    exchange = Exchange(*GetPcbId.build_command_packet())
+    send_command(exchange)
+
+    answer = struct.pack("<Q", 26) + trailer()
+    needs = []
+    while not isinstance(event := exchange.next_event(), Done):
+        needs.append(len(event.buffer))
+        count = min(len(event.buffer), 3)
+        event.buffer[:count] = answer[:count]
+        exchange.received(count)
+        answer = answer[count:]
+
+    assert needs == [14, 11, 8, 5, 2]
+    assert parse_result(GetPcbId, event.response, event.status) == 26
+
+
+def test_exchange_fed_too_much():
+    exchange = Exchange(*GetPcbId.build_command_packet())
+    send_command(exchange)
+
+    with pytest.raises(ValueError):
+        exchange.feed(bytes(15))
+
+
+def test_chunked_transfer():
+    progress = []
+    data, response_length, transfer = LoggerDeleteChunkRange.build_command_packet(
+        StartingSeqNumber=1, EndingSeqNumber=2, ByteCount=3
+    )
+    exchange = Exchange(data, response_length, transfer, window=5, progress=progress.append)
+    send_command(exchange)
+
+    sent = []
+    while isinstance(event := exchange.next_event(), Send):
+        assert event.raw
+        sent.append(bytes(event.data))
+        exchange.sent(len(event.data))
+
+    assert b"".join(sent) == bytes(transfer)
+    assert [len(chunk) for chunk in sent] == [5, 5, 2]
+    assert [(p.transferred, p.total) for p in progress] == [(5, 12), (10, 12), (12, 12)]
+
+    fill(exchange, trailer())
+    assert parse_result(LoggerDeleteChunkRange, *exchange.result()) is Status.Success
+
+
+def test_stalled_transfer():
+    data, response_length, transfer = LoggerDeleteChunkRange.build_command_packet(
+        StartingSeqNumber=1, EndingSeqNumber=2, ByteCount=3
+    )
+    exchange = Exchange(data, response_length, transfer)
+    send_command(exchange)
+
+    with pytest.raises(ConnectionError):
+        exchange.sent(0)
+
+
+def test_stream_exchange_hands_out_chunks():
+    response = bytes(range(10))
+    exchange = StreamExchange(b"packet", len(response), chunk_size=4, buffers=2)
+    send_command(exchange)
+
+    chunks = []
+    answer = response + trailer()
+    while not isinstance(event := exchange.next_event(), Done):
+        if isinstance(event, Data):
+            chunks.append(bytes(event.chunk))
+            continue
+        count = min(len(event.buffer), 4)
+        event.buffer[:count] = answer[:count]
+        exchange.received(count)
+        answer = answer[count:]
+
+    assert chunks == [response[0:4], response[4:8], response[8:10]]
+    assert event.status is Status.Success
+
+
+def test_stream_exchange_fed_whole_messages():
+    response = bytes(range(10))
+    exchange = StreamExchange(b"packet", len(response), chunk_size=4)
+    send_command(exchange)
+
+    exchange.feed(response[:6])
+    assert bytes(exchange.next_event().chunk) == response[:6]
+    exchange.feed(response[6:] + trailer(ERROR))
+    assert bytes(exchange.next_event().chunk) == response[6:]
+    assert exchange.next_event().status is ERROR
+
+
+def test_batch_fails_before_anything_is_sent():
+    with pytest.raises(TypeError):
+        prepare_batch([(GetPcbId, {}), (SRAMFWUpdateLoadData, {"UpdateFileStream": b""})])
+
+    ((command, kwargs, packet),) = prepare_batch([("GetPcbId", {})])
+    assert command is GetPcbId and packet == GetPcbId.build_command_packet()
@@ -0,0 +1,66 @@
+import os
+import socket
+import threading
+import pytest
+from bands import ScriptedBand
+from msband.static.command import EFlashRead, GetPcbId
+from msband.daemon import BandDaemon, DaemonInterface, DaemonError
+
+FLASH = bytes(range(256)) * 64
+
+
+def read(packet: bytes, transfer) -> bytes:
+    address = int.from_bytes(packet[8:12], "little")
+    length = int.from_bytes(packet[12:16], "little")
+    return FLASH[address : address + length]
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    band = ScriptedBand({EFlashRead: read, GetPcbId: bytes([26])})
+    daemon = BandDaemon({"band": band}, str(tmp_path / "msband.sock"))
+    thread = threading.Thread(target=daemon.serve_forever, daemon=True)
+    thread.start()
+    yield daemon
+    daemon.server.shutdown()
+    thread.join()
+
+
+def test_stream_stopped_early_leaves_the_connection_usable(daemon):
+    client = DaemonInterface(path=daemon.path)
+
+    stream = client.command_stream(EFlashRead, chunk_size=1024, Address=0, DataLength=len(FLASH))
+    assert bytes(next(stream)) == FLASH[:1024]
+    stream.close()
+
+    assert client.command(GetPcbId) == 26
+    assert client.command(EFlashRead, Address=256, DataLength=16) == FLASH[256:272]
+
+
+def test_abandoned_stream_is_skipped_by_the_next_answer(daemon):
+    client = DaemonInterface(path=daemon.path)
+
+    abandoned = client.command_stream(EFlashRead, chunk_size=1024, Address=0, DataLength=4096)
+    next(abandoned)
+
+    assert client.command(GetPcbId) == 26
+    abandoned.close()  # a newer request was answered since, nothing left to read
+    assert client.command(GetPcbId) == 26
+
+
+def test_stale_socket_is_replaced(tmp_path):
+    path = str(tmp_path / "msband.sock")
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(path)
+    stale.close()  # bound but nobody listening, like after a crash
+
+    daemon = BandDaemon({"band": ScriptedBand({})}, path)
+    daemon.close()
+
+
+def test_running_daemon_keeps_its_socket(daemon):
+    with pytest.raises(DaemonError):
+        BandDaemon({"band": ScriptedBand({})}, daemon.path)
+
+    assert os.path.exists(daemon.path)
+    assert DaemonInterface(path=daemon.path).command(GetPcbId) == 26
@@ -0,0 +1,42 @@
+import asyncio
+import functools
+from bands import ScriptedBand
+from msband.fleet import BandFleet
+from msband.static.command import GetPcbId
+
+
+def fleet_of(count: int) -> BandFleet:
+    fleet = BandFleet(workers=2)
+    for index in range(count):
+        fleet.add(f"band:{index}", ScriptedBand({GetPcbId: bytes([26 + index])}))
+    return fleet
+
+
+async def pcb_id(iband: ScriptedBand, offset: int = 0) -> int:
+    await asyncio.sleep(0)
+    return iband.command(GetPcbId) + offset
+
+
+def collect(fleet: BandFleet, operation) -> dict:
+    async def results():
+        return {result.device: result async for result in fleet.arun(operation)}
+
+    return asyncio.run(results())
+
+
+def test_arun_awaits_coroutines_returned_by_plain_callables():
+    fleet = fleet_of(3)
+
+    for operation in (lambda iband: pcb_id(iband), functools.partial(pcb_id, offset=100)):
+        results = collect(fleet, operation)
+        assert all(result.ok for result in results.values())
+        assert sorted(result.result % 100 for result in results.values()) == [26, 27, 28]
+
+
+def test_arun_runs_coroutine_functions_and_blocking_callables():
+    fleet = fleet_of(2)
+
+    assert {d: r.result for d, r in collect(fleet, pcb_id).items()} == {"band:0": 26, "band:1": 27}
+    assert {
+        d: r.result for d, r in collect(fleet, lambda iband: iband.command(GetPcbId)).items()
+    } == {"band:0": 26, "band:1": 27}
@@ -0,0 +1,64 @@
+import struct
+import pytest
+from msband.static import SensorType
+from msband.logs import RECORD_HEADER, LogFormatError, decode_chunks, decode_columns
+
+ACCEL_GYRO = SensorType.AccelGyro_2_4_MS_16G
+
+
+def record(sensor_type: int, payload: bytes, missed: int = 0) -> bytes:
+    return RECORD_HEADER.pack(sensor_type, missed, len(payload)) + payload
+
+
+def log_entry(ticks: int) -> bytes:
+    return record(SensorType.LogEntry.value, struct.pack("<Q", ticks))
+
+
+def samples(*values: int) -> bytes:
+    return b"".join(struct.pack("<6h", *([value] * 6)) for value in values)
+
+
+def split(data: bytes, *offsets: int):
+    bounds = [0, *offsets, len(data)]
+    return [data[start:end] for start, end in zip(bounds, bounds[1:])]
+
+
+def test_records_split_between_chunks_decode_whole():
+    log = log_entry(10_000_000) + record(ACCEL_GYRO.value, samples(1, 2)) + log_entry(20)
+
+    # Inside the first header, inside a payload, and on a record boundary
+    for chunks in (split(log, 2), split(log, 20), split(log, 12, 13, 14)):
+        records = list(decode_chunks(chunks))
+        assert [r.type for r in records] == [SensorType.LogEntry, ACCEL_GYRO, SensorType.LogEntry]
+        assert [s.AccelX for s in records[1].parse()] == [1, 2]
+        assert records[1].timestamp == 10_000_000
+        assert records[2].timestamp == 20
+
+
+@pytest.mark.parametrize(
+    "log",
+    [
+        record(0x01, b"\0" * 4),  # no such SensorType
+        RECORD_HEADER.pack(ACCEL_GYRO.value, 0, 0xFFF0),  # longer than a chunk
+        record(ACCEL_GYRO.value, samples(1) + b"\0" * 5),  # half a sample
+        record(SensorType.LogEntry.value, b"\0" * 4),  # no room for the timestamp
+    ],
+)
+def test_implausible_headers_raise(log):
+    with pytest.raises(LogFormatError):
+        list(decode_chunks([log_entry(1) + log]))
+
+    # Also when the header is split between chunks
+    with pytest.raises(LogFormatError):
+        list(decode_chunks(split(log_entry(1) + log, 13)))
+
+
+def test_columns_check_headers_too():
+    pytest.importorskip("numpy")
+    log = log_entry(10_000_000) + record(ACCEL_GYRO.value, samples(1, 2, 3))
+
+    columns = decode_columns(split(log, 30), ACCEL_GYRO)
+    assert list(columns["GyroZ"]) == [1, 2, 3]
+
+    with pytest.raises(LogFormatError):
+        decode_columns([log + record(0x01, b"")], ACCEL_GYRO)
@@ -0,0 +1,121 @@
+import threading
+import concurrent.futures
+import pytest
+from msband.protocol import MockInterface
+from msband.static.command import GetPcbId
+from msband.multiplexer import CommandMultiplexer, Priority
+
+
+class OneAtATime(MockInterface):
+    # Remembers how many commands were ever inside communicate() at once
+    __slots__ = "inside", "most", "lock"
+
+    def __init__(self):
+        super().__init__()
+        self.inside = 0
+        self.most = 0
+        self.lock = threading.Lock()
+
+    def communicate(self, *args, **kwargs):
+        with self.lock:
+            self.inside += 1
+            self.most = max(self.most, self.inside)
+        try:
+            return super().communicate(*args, **kwargs)
+        finally:
+            with self.lock:
+                self.inside -= 1
+
+
+def hold(multiplexer: CommandMultiplexer) -> threading.Event:
+    # Keeps the I/O thread busy until the returned event is set
+    started, release = threading.Event(), threading.Event()
+
+    def wait(iband):
+        started.set()
+        release.wait(5)
+
+    multiplexer.submit(wait, Priority.Interactive)
+    started.wait(5)
+    return release
+
+
+def test_priority_order_and_fifo_within_a_priority():
+    ran = []
+
+    with CommandMultiplexer(MockInterface()) as multiplexer:
+        release = hold(multiplexer)
+        futures = [
+            multiplexer.submit(lambda iband, name=name: ran.append(name), priority)
+            for name, priority in [
+                ("bulk", Priority.Bulk),
+                ("normal 1", Priority.Normal),
+                ("interactive", Priority.Interactive),
+                ("normal 2", Priority.Normal),
+            ]
+        ]
+        assert multiplexer.metrics().depth_by_priority == {
+            Priority.Interactive: 1,
+            Priority.Normal: 2,
+            Priority.Bulk: 1,
+        }
+        release.set()
+        concurrent.futures.wait(futures)
+
+    assert ran == ["interactive", "normal 1", "normal 2", "bulk"]
+
+
+def test_commands_from_many_threads_never_interleave():
+    iband = OneAtATime()
+
+    with CommandMultiplexer(iband) as multiplexer:
+        with concurrent.futures.ThreadPoolExecutor(8) as callers:
+            futures = [
+                callers.submit(lambda: multiplexer.command(GetPcbId).result()) for _ in range(200)
+            ]
+            assert [future.result() for future in futures] == [0] * 200
+
+    assert iband.most == 1
+    assert multiplexer.metrics().completed == 200
+
+
+def test_failures_reach_the_caller_and_are_counted():
+    def broken(iband):
+        raise ConnectionResetError("unplugged")
+
+    with CommandMultiplexer(MockInterface()) as multiplexer:
+        with pytest.raises(ConnectionResetError):
+            multiplexer.submit(broken).result(5)
+        assert multiplexer.command(GetPcbId).result(5) == 0
+
+    metrics = multiplexer.metrics()
+    assert (metrics.submitted, metrics.completed, metrics.failed) == (2, 1, 1)
+    assert metrics.depth == 0
+
+
+def test_cancelled_requests_are_skipped():
+    ran = []
+
+    with CommandMultiplexer(MockInterface()) as multiplexer:
+        release = hold(multiplexer)
+        cancelled = multiplexer.submit(lambda iband: ran.append("cancelled"))
+        kept = multiplexer.submit(lambda iband: ran.append("kept"))
+        assert cancelled.cancel()
+        release.set()
+        kept.result(5)
+
+    assert ran == ["kept"]
+
+
+def test_close_runs_what_is_queued_then_refuses_more():
+    ran = []
+    multiplexer = CommandMultiplexer(MockInterface())
+    release = hold(multiplexer)
+    queued = multiplexer.submit(lambda iband: ran.append("queued"), Priority.Bulk)
+
+    threading.Timer(0.05, release.set).start()
+    multiplexer.close()
+
+    assert queued.done() and ran == ["queued"]
+    with pytest.raises(RuntimeError):
+        multiplexer.submit(lambda iband: None)
@@ -0,0 +1,67 @@
+import io
+import errno
+import pathlib
+import pytest
+from bands import ScriptedBand
+from msband.static.command import EFlashRead
+from msband.resilience import Backoff, ResilientInterface, is_retryable
+
+NO_WAIT = Backoff(attempts=3, initial=0.0, jitter=0.0)
+
+
+class FullDisk(io.BytesIO):
+    def write(self, data: bytes) -> int:
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+
+def flash(data: bytes, failures: int = 0) -> ScriptedBand:
+    def read(packet: bytes, transfer) -> bytes:
+        nonlocal failures
+        if failures:
+            failures -= 1
+            raise ConnectionResetError("unplugged")
+        address = int.from_bytes(packet[8:12], "little")
+        length = int.from_bytes(packet[12:16], "little")
+        return data[address : address + length]
+
+    iband = ScriptedBand({EFlashRead: read})
+    iband.acquire()
+    return iband
+
+
+@pytest.mark.parametrize(
+    "error, retryable",
+    [
+        (ConnectionResetError(), True),
+        (TimeoutError(), True),
+        (OSError(errno.EHOSTDOWN, "Host is down"), True),
+        (OSError(errno.ENOSPC, "No space left on device"), False),
+        (OSError(errno.EIO, "Input/output error"), False),
+        (OSError(errno.EROFS, "Read-only file system"), False),
+        (PermissionError(errno.EACCES, "Permission denied"), False),
+    ],
+)
+def test_only_transport_errors_are_retryable(error, retryable):
+    assert is_retryable(error) is retryable
+
+
+def test_read_flash_resumes_after_a_transport_failure(tmp_path):
+    data = bytes(range(256)) * 4
+    resilient = ResilientInterface(flash(data, failures=2), NO_WAIT)
+
+    assert resilient.read_flash(tmp_path / "flash.bin", 0, len(data), piece=100) == len(data)
+    assert (tmp_path / "flash.bin").read_bytes() == data
+    assert resilient.reconnects == 2
+
+
+def test_read_flash_raises_a_full_disk_at_once(tmp_path, monkeypatch):
+    iband = flash(bytes(1024))
+    resilient = ResilientInterface(iband, NO_WAIT)
+    monkeypatch.setattr(pathlib.Path, "open", lambda path, mode="r": FullDisk())
+
+    with pytest.raises(OSError) as raised:
+        resilient.read_flash(tmp_path / "flash.bin", 0, 1024, piece=100)
+
+    assert raised.value.errno == errno.ENOSPC
+    assert iband.asked.count(EFlashRead) == 1
+    assert resilient.reconnects == 0
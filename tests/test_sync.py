@@ -0,0 +1,131 @@
+import struct
+import pytest
+from bands import ScriptedBand
+from msband.resilience import Backoff
+from msband.protocol import StatusError
+from msband.static.status import Status
+from msband.sync import LogSync, SyncJournal
+from msband.static.command import (
+    LoggerGetChunkCounts,
+    LoggerGetChunkRangeMetadata,
+    LoggerGetChunkRangeData,
+    LoggerDeleteChunkRange,
+)
+
+NO_WAIT = Backoff(attempts=3, initial=0.0, jitter=0.0)
+
+
+class Logger:
+    # Logger chunks of a pretend Band, ranges count from the oldest chunk not deleted yet
+    def __init__(self, count: int = 10):
+        self.chunks = [(seq, bytes([seq]) * 100) for seq in range(100, 100 + count)]
+        self.deletes = 0
+        self.refuse = False
+        self.lose_answer = 0  # deletes that happen but whose answer never arrives
+
+    def band(self) -> ScriptedBand:
+        iband = ScriptedBand(
+            {
+                LoggerGetChunkCounts: self.counts,
+                LoggerGetChunkRangeMetadata: self.metadata,
+                LoggerGetChunkRangeData: self.data,
+                LoggerDeleteChunkRange: self.delete,
+            },
+        )
+        iband.acquire()
+        return iband
+
+    def counts(self, data: bytes, transfer) -> bytes:
+        return struct.pack("<II", len(self.chunks), 0)
+
+    def metadata(self, data: bytes, transfer) -> bytes:
+        (count,) = struct.unpack_from("<I", data, 8)
+        held = self.chunks[:count]
+        if not held:
+            return bytes(12)
+        return struct.pack("<III", held[0][0], held[-1][0], sum(len(c) for _, c in held))
+
+    def data(self, data: bytes, transfer) -> bytes:
+        start, end, _ = struct.unpack_from("<III", data, 8)
+        return b"".join(chunk for seq, chunk in self.chunks if start <= seq <= end)
+
+    def delete(self, data: bytes, transfer: bytes) -> bytes:
+        start, end, _ = struct.unpack("<III", transfer)
+        if self.refuse:
+            return b""
+        self.deletes += 1
+        self.chunks = [(seq, chunk) for seq, chunk in self.chunks if not start <= seq <= end]
+        if self.lose_answer:
+            self.lose_answer -= 1
+            raise ConnectionResetError("answer lost")
+        return b""
+
+
+def test_refused_delete_is_not_journalled(tmp_path):
+    logger = Logger()
+    logger.refuse = True
+    iband = logger.band()
+    iband.statuses[LoggerDeleteChunkRange] = Status.EFlashTimeout
+
+    with pytest.raises(StatusError):
+        LogSync(iband, tmp_path, chunk_count=4, backoff=NO_WAIT).run()
+
+    # Still outstanding, the next sync deletes them without fetching them again
+    outstanding = SyncJournal(tmp_path).outstanding()
+    assert [(s.range.start, s.range.end) for s in outstanding] == [(100, 103), (104, 107)]
+    assert len(logger.chunks) == 10
+
+    logger.refuse = False
+    report = LogSync(logger.band(), tmp_path, chunk_count=4, backoff=NO_WAIT).run()
+    assert [(s.range.start, s.range.end) for s in report.recovered] == [(100, 103), (104, 107)]
+    assert report.chunks == 2
+    assert not logger.chunks
+
+
+def test_delete_whose_answer_was_lost_is_not_repeated(tmp_path):
+    logger = Logger()
+    logger.lose_answer = 1
+
+    report = LogSync(logger.band(), tmp_path, chunk_count=4, backoff=NO_WAIT).run()
+
+    assert report.chunks == 10
+    assert not logger.chunks
+    assert logger.deletes == 3  # 100-103, 104-107 and 108-109, each once
+    assert not SyncJournal(tmp_path).outstanding()
+
+
+def test_malformed_fetch_is_raised_not_retried(tmp_path):
+    logger = Logger()
+    fetches = 0
+
+    def malformed(data: bytes, transfer) -> bytes:
+        nonlocal fetches
+        fetches += 1
+        raise ValueError("malformed message")
+
+    iband = logger.band()
+    iband.answers[LoggerGetChunkRangeData] = malformed
+
+    with pytest.raises(ValueError, match="malformed message"):
+        LogSync(iband, tmp_path, chunk_count=4, backoff=NO_WAIT).run()
+
+    assert fetches == 1
+    assert len(logger.chunks) == 10
+
+
+def test_band_counting_ranges_differently_falls_back_to_one_batch_at_a_time(tmp_path):
+    logger = Logger()
+    iband = logger.band()
+    metadata = logger.metadata
+
+    def from_the_newest(data: bytes, transfer) -> bytes:
+        # Makes no sense while fetched chunks are still on the Band, which pipelining needs
+        if iband.asked.count(LoggerGetChunkRangeData) > logger.deletes:
+            return struct.pack("<III", 1, 1, 1)
+        return metadata(data, transfer)
+
+    iband.answers[LoggerGetChunkRangeMetadata] = from_the_newest
+    report = LogSync(iband, tmp_path, chunk_count=4, backoff=NO_WAIT).run()
+
+    assert report.chunks == 10
+    assert not logger.chunks
@@ -0,0 +1,119 @@
+import struct
+import asyncio
+import pytest
+import usb.core
+from msband.protocol import USBInterface, AsyncUSBInterface, USBDeviceNotFound
+from msband.static.command import Command, GetPcbId
+from msband.static.constants import ENVOY, BandType
+
+SUCCESS = bytes.fromhex("FEA600000000")
+
+
+class FakeDevice:
+    # Just enough of a usb.core.Device for USBInterface.claim
+    def __init__(self, bus: int, address: int, serial_number: str):
+        self.idVendor = ENVOY.UsbVendorId
+        self.idProduct = ENVOY.UsbProductId
+        self.bus = bus
+        self.address = address
+        self.serial_number = serial_number
+        self.pcb_id = 26
+        self.pending = bytearray()  # what the Band answers next
+
+        self.interface = [FakeEndpoint(self), FakeEndpoint(self)]
+
+    def __iter__(self):
+        return iter([FakeConfiguration(self.interface)])
+
+
+class FakeEndpoint:
+    wMaxPacketSize = 64
+
+    def __init__(self, device: FakeDevice):
+        self.device = device
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        if Command.from_bytes.get(data[2:4]) is GetPcbId:
+            (length,) = struct.unpack_from("<I", data, 4)
+            self.device.pending += bytes([self.device.pcb_id]).ljust(length, b"\0") + SUCCESS
+        return len(data)
+
+    def read(self, length: int) -> bytes:
+        data = bytes(self.device.pending[:length])
+        del self.device.pending[:length]
+        return data
+
+
+class FakeConfiguration(list):
+    def __init__(self, interface):
+        super().__init__([interface])
+
+    def set(self) -> None:
+        pass
+
+
+@pytest.fixture
+def devices(monkeypatch):
+    plugged = []
+
+    def find(find_all=False, custom_match=None, **attributes):
+        found = [
+            device
+            for device in plugged
+            if all(getattr(device, name) == value for name, value in attributes.items())
+            and (custom_match is None or custom_match(device))
+        ]
+        if find_all:
+            return iter(found)
+        return found[0] if found else None
+
+    monkeypatch.setattr(usb.core, "find", find)
+    return plugged
+
+
+def test_reacquire_finds_the_band_at_its_new_address(devices):
+    band = FakeDevice(bus=1, address=5, serial_number="BAND-A")
+    devices.append(band)
+
+    iband = USBInterface()
+    iband.attach(band)
+    assert iband.identity == "usb:BAND-A"
+
+    # Replugged: same Band, new address, and another Band took the old one
+    devices.clear()
+    other = FakeDevice(bus=1, address=5, serial_number="BAND-B")
+    replugged = FakeDevice(bus=1, address=9, serial_number="BAND-A")
+    devices.extend([other, replugged])
+
+    iband.reacquire()
+    assert iband.identity == "usb:BAND-A"
+    assert iband.acquire_vars["serial"] == "BAND-A"
+
+
+def test_reacquire_fails_while_the_band_is_gone(devices):
+    band = FakeDevice(bus=1, address=5, serial_number="BAND-A")
+    devices.append(band)
+
+    iband = USBInterface()
+    iband.attach(band)
+
+    devices[:] = [FakeDevice(bus=1, address=5, serial_number="BAND-B")]
+    with pytest.raises(USBDeviceNotFound):
+        iband.reacquire()
+
+
+def test_async_attach_knows_the_band_type(devices):
+    band = FakeDevice(bus=1, address=5, serial_number="BAND-A")
+    band.pcb_id = 9
+    devices.append(band)
+
+    async def attach() -> AsyncUSBInterface:
+        iband = AsyncUSBInterface()
+        await iband.attach(band)
+        return iband
+
+    iband = asyncio.run(attach())
+    assert iband.band_type is BandType.Cargo
+    assert iband.constants.BandType is BandType.Cargo
+    assert iband.acquire_vars["serial"] == "BAND-A"